@@ -19,4 +19,10 @@ class SourceTypes(models.TextChoices):
     STANDARDS = "STANDARDS", "Standards"
     MANUALS = "MANUALS", "Manuals / Handbooks"
     RECRUITMENT_NOTICES = "RECRUITMENT_NOTICES", "Recruitment Notices"
-    GOVERNMENT_PORTAL = "GOVERNMENT_PORTAL", "Government Portals"
\ No newline at end of file
+    GOVERNMENT_PORTAL = "GOVERNMENT_PORTAL", "Government Portals"
+
+class JobStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    DEAD = "DEAD", "Dead (retries exhausted)"
@@ -0,0 +1,80 @@
+from threading import Lock, local
+import zstandard
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSION_LEVEL = 9
+
+_dictionaries = {} # dict_id -> ZstdCompressionDict
+_current_dict_id = None
+_loaded = False
+_lock = Lock()
+_codecs = local() # zstd (de)compressors are not thread safe
+
+
+def load_dictionaries(force=False):
+    """Load the trained dictionaries once per process, the newest one is used to compress."""
+    global _current_dict_id, _loaded
+    from law_acts.models import CompressionDictionary
+
+    with _lock:
+        if _loaded and not force:
+            return
+        for dict_id, data in CompressionDictionary.objects.order_by('created_at').values_list('dict_id', 'data'):
+            _dictionaries[dict_id] = zstandard.ZstdCompressionDict(bytes(data))
+            _current_dict_id = dict_id
+        _loaded = True
+
+
+def current_dict_id():
+    load_dictionaries()
+    return _current_dict_id or 0
+
+
+def _compressor():
+    dict_id = current_dict_id()
+    if getattr(_codecs, "dict_id", None) != dict_id:
+        _codecs.dict_id = dict_id
+        _codecs.compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVEL, dict_data=_dictionaries.get(dict_id),
+        )
+    return _codecs.compressor
+
+
+def _decompressor(dict_id):
+    decompressors = getattr(_codecs, "decompressors", None)
+    if decompressors is None:
+        decompressors = _codecs.decompressors = {}
+    if dict_id not in decompressors:
+        if dict_id and dict_id not in _dictionaries:
+            # Trained by another process after we loaded.
+            load_dictionaries(force=True)
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=_dictionaries.get(dict_id))
+    return decompressors[dict_id]
+
+
+def frame_dict_id(data):
+    """Dictionary id of a compressed value, None if it is plain UTF-8 text."""
+    data = bytes(data)
+    if not data.startswith(ZSTD_MAGIC):
+        return None
+    return zstandard.get_frame_parameters(data).dict_id
+
+
+def compress_text(text):
+    return _compressor().compress(text.encode())
+
+
+def decompress_text(data):
+    """
+    Decode a stored value. Rows written before the column was compressed are
+    plain UTF-8, which can never start with the zstd magic bytes.
+    """
+    data = bytes(data)
+    dict_id = frame_dict_id(data)
+    if dict_id is None:
+        return data.decode()
+    return _decompressor(dict_id).decompress(data).decode()
+
+
+def train_dictionary(samples, dict_size=112640):
+    return zstandard.train_dictionary(dict_size, [sample.encode() for sample in samples])
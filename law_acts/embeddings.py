@@ -0,0 +1,48 @@
+import os
+from hashlib import sha256
+from threading import Lock
+from django.conf import settings
+
+EMBEDDING_DIMENSIONS = 384
+
+_models = {}
+_models_lock = Lock()
+
+
+def text_hash(text):
+    return sha256(text.encode()).hexdigest()
+
+
+def pin_threads(threads):
+    """
+    Pin the BLAS/OpenMP pools used for CPU inference. Env vars only take
+    effect before torch is imported, so call this before `get_model`.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    import torch
+    torch.set_num_threads(threads)
+
+
+def get_model(model_name=None):
+    """Load (once per process) the sentence-transformers model on CPU."""
+    model_name = model_name or settings.EMBEDDING_MODEL
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name, device="cpu")
+    return _models[model_name]
+
+
+def embed_texts(texts, batch_size=256, model_name=None):
+    """Embed texts into normalized 384-dim vectors, returned as lists of floats."""
+    model = get_model(model_name)
+    vectors = model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return vectors.tolist()
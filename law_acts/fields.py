@@ -0,0 +1,45 @@
+from django.db import models
+from law_acts.compression import compress_text, decompress_text
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text stored as zstd frames in a bytea column, compressed with the newest
+    trained dictionary and decompressed transparently when read.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("editable") is True:
+            del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def get_default(self):
+        # BinaryField falls back to b"", the text equivalent is "".
+        default = super().get_default()
+        return "" if default == b"" else default
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return compress_text(str(value))
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.TextField().formfield(**kwargs)
@@ -0,0 +1,100 @@
+"""
+Durable work queue in Postgres. Commands enqueue jobs, any number of
+`manage.py worker` processes, on any host sharing the database, lease them
+with FOR UPDATE SKIP LOCKED, extend the lease while they work, and retry
+failures with exponential backoff until `max_attempts`, after which the job
+is dead-lettered (status DEAD) for inspection.
+"""
+import random
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from law_acts.choices import JobStatus
+from law_acts.models import Job
+
+# kind -> handler(payload), which may return follow-up jobs as (kind, payload, key) tuples.
+HANDLERS = {
+    "ingest_pdf": "law_acts.management.commands.ingest_pdfs.ingest_pdf_job",
+    "kanoon_task": "law_acts.management.commands.indian_kanoon.kanoon_job",
+}
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def enqueue(jobs, batch_size=1000):
+    """
+    Add (kind, payload, key) jobs. A job whose key matches a pending or
+    running job is dropped, so enqueueing the same work twice is harmless.
+    """
+    buffer = []
+    for kind, payload, key in jobs:
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        buffer.append(Job(kind=kind, payload=payload, key=key))
+        if len(buffer) >= batch_size:
+            Job.objects.bulk_create(buffer, ignore_conflicts=True)
+            buffer = []
+    Job.objects.bulk_create(buffer, ignore_conflicts=True)
+
+
+def claim(worker, limit, lease, kinds=None):
+    """
+    Lease up to `limit` runnable jobs. Running jobs whose lease ran out
+    belong to a dead worker and are taken over.
+    """
+    now = timezone.now()
+    runnable = Q(status=JobStatus.PENDING, run_after__lte=now) | Q(status=JobStatus.RUNNING, leased_until__lt=now)
+    with transaction.atomic():
+        qs = Job.objects.select_for_update(skip_locked=True).filter(runnable)
+        if kinds:
+            qs = qs.filter(kind__in=kinds)
+        jobs = list(qs.order_by("run_after", "id")[:limit])
+        for job in jobs:
+            if job.status == JobStatus.RUNNING and job.attempts >= job.max_attempts:
+                # Its last attempt took the worker down with it.
+                job.status, job.leased_by, job.leased_until = JobStatus.DEAD, None, None
+                job.last_error = job.last_error or "Lease expired on the last attempt"
+                continue
+            job.status = JobStatus.RUNNING
+            job.attempts += 1
+            job.leased_by = worker
+            job.leased_until = now + lease
+        Job.objects.bulk_update(jobs, ["status", "attempts", "leased_by", "leased_until", "last_error"])
+    return [job for job in jobs if job.status == JobStatus.RUNNING]
+
+
+def heartbeat(worker, job_ids, lease):
+    """Extend the lease of jobs this worker is still running."""
+    return Job.objects.filter(id__in=job_ids, leased_by=worker, status=JobStatus.RUNNING).update(
+        leased_until=timezone.now() + lease,
+    )
+
+
+def run(job):
+    return import_string(HANDLERS[job.kind])(job.payload) or []
+
+
+def complete(job, follow_ups=()):
+    # Follow-ups and the completion commit together, a crash in between
+    # re-runs the job instead of losing its children.
+    with transaction.atomic():
+        enqueue(follow_ups)
+        Job.objects.filter(id=job.id, leased_by=job.leased_by).update(
+            status=JobStatus.DONE, leased_until=None, last_error=None,
+        )
+
+
+def fail(job, error):
+    """Schedule a retry with exponential backoff and jitter, or dead-letter the job."""
+    if job.attempts >= job.max_attempts:
+        updates = {"status": JobStatus.DEAD}
+    else:
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+        updates = {
+            "status": JobStatus.PENDING,
+            "run_after": timezone.now() + timedelta(seconds=delay * random.uniform(0.5, 1.5)),
+        }
+    Job.objects.filter(id=job.id, leased_by=job.leased_by).update(leased_until=None, last_error=error, **updates)
+    return updates["status"]
@@ -1,14 +1,17 @@
 from django.core.management.base import BaseCommand
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from requests import get as getReq
 from bs4 import BeautifulSoup
+from django.conf import settings
 from law_acts.models import Act
+from nyaya_ai.http_cache import HttpCache
+from nyaya_ai.http_client import HttpClient
 from nyaya_ai.utils import (
-    headers,
     convert_to_english,
     download_pdf,
     normalize_text,
-    sanitize_and_shorten
+    pdf_sha256,
+    sanitize_and_shorten,
+    submit_bounded,
 )
 from django.utils import timezone
 
@@ -16,99 +19,153 @@ class Command(BaseCommand):
     help = "Fetches acts and downloads PDFs"
     domain = "https://www.indiacode.nic.in"
     total_acts = []
-    updated_headers = headers
-    updated_headers.update({
-        "Referer": "https://www.indiacode.nic.in/", 
-    })
+    # Listing and detail pages rarely change between cycles of download_resources.sh.
+    client = HttpClient(headers={
+        "Referer": "https://www.indiacode.nic.in/",
+    }, cache=HttpCache(settings.HTTP_CACHE_DIR / "indiacode", ttl=12 * 3600))
     save_dir_obj = {
         'Central': 'resources/pdfs/central_acts/',
         'Repealed': 'resources/pdfs/repealed_acts/',
         'Spent': 'resources/pdfs/spent_acts/',
     }
 
+    listing_fields = ("Enactment Date", "Act Number", "Short Title", "View")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max_workers', type=int, default=10,
+            help='Concurrent act detail page fetches.',
+        )
+
     def handle(self, *args, **options):
+        self.max_workers = options.get('max_workers', 10)
+        self.load_stored_acts()
         self.fetch_central_acts()
         self.fetch_repealed_acts()
         self.fetch_spent_acts()
         self.stdout.write(f"Acts data fetched, total acts: {len(self.total_acts)}...")
         self.save_acts_to_db()
         self.download_pdfs_multithread()
+        self.stdout.write(self.style.SUCCESS(f"[HTTP-CACHE] {self.client.cache.report()}"))
+
+    def load_stored_acts(self):
+        self.stored_acts = {
+            title: (metadata, pdf_urls, act_id)
+            for act_id, title, metadata, pdf_urls in Act.objects.values_list('id', 'title', 'metadata', 'pdf_urls')
+        }
 
     def save_acts_to_db(self):
+        """Upsert acts that are new or whose metadata / PDF links changed since the last run."""
         self.stdout.write(self.style.SUCCESS(f"Saving acts to db..."))
+        acts = {}
+        metadata_only = {}
         for act in self.total_acts:
             title = sanitize_and_shorten(act['metadata']['title'])
-            if not Act.objects.filter(title=title).exists():
-                Act.objects.create(
-                    title=title,
-                    metadata=act['metadata'],
-                    pdf_urls=act['pdf_urls'],
-                )
-        self.stdout.write(self.style.SUCCESS(f"Acts saved to db..."))
+            stored = self.stored_acts.get(title)
+            if stored and stored[:2] == (act['metadata'], act['pdf_urls']):
+                continue
+            if stored and stored[1] == act['pdf_urls']:
+                # Same PDFs, whatever was downloaded for them still stands.
+                metadata_only[title] = Act(id=stored[2], metadata=act['metadata'])
+                continue
+            # New or changed PDF links have to be downloaded again.
+            acts[title] = Act(title=title, metadata=act['metadata'], pdf_urls=act['pdf_urls'], is_pdf_fetched=False)
+
+        Act.objects.bulk_create(
+            list(acts.values()),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['title'],
+            update_fields=['metadata', 'pdf_urls', 'is_pdf_fetched'],
+        )
+        Act.objects.bulk_update(list(metadata_only.values()), ['metadata'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Acts saved to db, {len(acts) + len(metadata_only)} new or changed..."))
 
     def fetch_central_acts(self, count=1000):
         cental_act_url = (
             f"{self.domain}/handle/123456789/1362/browse?type=shorttitle&rpp={count}"
         )
-        res = getReq(cental_act_url, allow_redirects=True, headers=self.updated_headers)
+        res = self.client.get(cental_act_url)
         if res.status_code != 200:
             self.stdout.write(f"status: {res.status_code}")
             return
 
         soup = BeautifulSoup(res.text, "lxml")
         rows = soup.select("tr")
+        to_fetch = []
+        unchanged = 0
         for tr in rows:
             tds = tr.select("td")
             if len(tds) < 4:
                 continue
 
             pdf_url = f"{self.domain}{tds[3].find('a')['href']}"
-            downloadable_urls = []
-            pdfpage_res = getReq(pdf_url, headers=self.updated_headers, allow_redirects=True)
-            if pdfpage_res.status_code != 200:
-                self.stdout.write(self.style.ERROR(f"status: {pdfpage_res.status_code} for {pdf_url}"))
+            act_name = tds[2].get_text(strip=True)
+            metadata = {
+                "Enactment Date": tds[0].get_text(strip=True),
+                "Act Number": tds[1].get_text(strip=True),
+                "Short Title": act_name,
+                "View": pdf_url,
+                "ActFrom" : "Central",
+                "title" : act_name,
+            }
+            stored = self.stored_acts.get(sanitize_and_shorten(act_name))
+            if stored and all(stored[0].get(field) == metadata[field] for field in self.listing_fields):
+                # Same listing row as last run, its detail page is not fetched again.
+                unchanged += 1
                 continue
+            to_fetch.append((metadata,))
 
-            pdfpage_soup = BeautifulSoup(pdfpage_res.text, "lxml")
-            pdfpage_links = pdfpage_soup.select("a")
-            for page_link in pdfpage_links:
-                link = page_link.attrs.get("href","#")
-                if not link.endswith(".pdf") or link.startswith("#") or link.endswith("userGuide.pdf"):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (metadata,), future in submit_bounded(executor, self.fetch_act_detail, to_fetch, self.max_workers * 2):
+                downloadable_urls = future.result()
+                if downloadable_urls is None:
                     continue
 
-                obj = {
-                    "pdf_url": f"{self.domain}{link}",
-                    "filename": page_link.get_text(strip=True),
-                }
-                downloadable_urls.append(obj)
-
-
-            act_name = tds[2].get_text(strip=True)
-            filename = convert_to_english(act_name)
-            self.total_acts.append(
-                {
-                    "metadata": {
-                        "Enactment Date": tds[0].get_text(strip=True),
-                        "Act Number": tds[1].get_text(strip=True),
-                        "Short Title": act_name,
-                        "View": pdf_url,
-                        "ActFrom" : "Central",
-                        "title" : act_name,  
-                    },
-                    "pdf_urls": downloadable_urls,
-                    "save_dir": "resources/pdfs/central_acts/",
-                }
-            )
-            self.stdout.write(self.style.SUCCESS(f"Successfully fetched {act_name}"))
+                self.total_acts.append(
+                    {
+                        "metadata": metadata,
+                        "pdf_urls": downloadable_urls,
+                        "save_dir": "resources/pdfs/central_acts/",
+                    }
+                )
+                self.stdout.write(self.style.SUCCESS(f"Successfully fetched {metadata['title']}"))
 
         self.stdout.write(
-            f"Central-Acts data fetched, total acts: {len(rows)}..."
+            f"Central-Acts data fetched, total acts: {len(rows)}, unchanged: {unchanged}..."
         )
 
+    def fetch_act_detail(self, metadata):
+        """PDF links listed on an act's detail page, None if the page could not be fetched."""
+        pdf_url = metadata["View"]
+        try:
+            pdfpage_res = self.client.get(pdf_url)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"{e} for {pdf_url}"))
+            return None
+        if pdfpage_res.status_code != 200:
+            self.stdout.write(self.style.ERROR(f"status: {pdfpage_res.status_code} for {pdf_url}"))
+            return None
+
+        downloadable_urls = []
+        pdfpage_soup = BeautifulSoup(pdfpage_res.text, "lxml")
+        pdfpage_links = pdfpage_soup.select("a")
+        for page_link in pdfpage_links:
+            link = page_link.attrs.get("href","#")
+            if not link.endswith(".pdf") or link.startswith("#") or link.endswith("userGuide.pdf"):
+                continue
+
+            obj = {
+                "pdf_url": f"{self.domain}{link}",
+                "filename": page_link.get_text(strip=True),
+            }
+            downloadable_urls.append(obj)
+        return downloadable_urls
+
 
     def fetch_repealed_acts(self):
         url = f"{self.domain}/repealed-act/repealed-act.jsp"
-        res = getReq(url, headers=self.updated_headers, allow_redirects=True)
+        res = self.client.get(url)
         res.raise_for_status()
         soup = BeautifulSoup(res.text, "lxml")
         rows = soup.find_all("tr")
@@ -143,7 +200,7 @@ class Command(BaseCommand):
 
     def fetch_spent_acts(self):
         url = f"{self.domain}/spent-act/spent-act.jsp"
-        res = getReq(url, headers=self.updated_headers, allow_redirects=True)
+        res = self.client.get(url)
         res.raise_for_status()
         soup = BeautifulSoup(res.text, "lxml")
         rows = soup.find_all("tr")
@@ -177,17 +234,25 @@ class Command(BaseCommand):
         )
 
     def download_act_pdf(self, data : dict):
+        pdf_hashes = []
         for pdf in data['pdf_urls']:
-            data = {
+            item = {
                 "pdf_url": normalize_text(pdf['pdf_url']),
                 "filename": normalize_text(pdf['filename']),
-                "updated_headers": self.updated_headers,
+                "client": self.client,
                 "save_dir": self.save_dir_obj.get((data['metadata'].get('ActFrom')),'resources/pdfs/central_acts/'),
             }
-            self.stdout.write(self.style.SUCCESS(f"Downloaded PDF \t {data['pdf_url']}"))
-            download_pdf(data)
-        
-        Act.objects.filter(id=data['id']).update(is_pdf_fetched=True, pdf_fetched_at=timezone.now())
+            self.stdout.write(self.style.SUCCESS(f"Downloaded PDF \t {item['pdf_url']}"))
+            pdf_hashes.append(pdf_sha256(download_pdf(item)))
+
+        if None in pdf_hashes:
+            # Left unfetched, the next run resumes or retries the missing files.
+            self.stdout.write(self.style.ERROR(f"[X] Incomplete PDFs for act {data['title']}"))
+            return
+
+        Act.objects.filter(id=data['id']).update(
+            is_pdf_fetched=True, pdf_fetched_at=timezone.now(), pdf_hashes=pdf_hashes,
+        )
 
 
     def download_pdfs_multithread(self):
@@ -0,0 +1,148 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from time import time
+from django import db
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, Max, Min, OuterRef
+from law_acts.embeddings import text_hash
+from law_acts.models import PDFPage, TextChunk
+from nyaya_ai.utils import get_traceback, split_into_chunks
+
+
+def pages_without_chunks():
+    # Pages chunked before is_chunked existed are still caught by the Exists.
+    return PDFPage.objects.filter(
+        ~Exists(TextChunk.objects.filter(pdf_page=OuterRef('pk'))),
+        is_chunked=False,
+    )
+
+
+def flush_chunks(chunks, page_ids):
+    """Insert the chunks and flag their pages, empty pages included, so no page is scanned twice."""
+    with transaction.atomic():
+        TextChunk.objects.bulk_create(chunks)
+        PDFPage.objects.filter(id__in=page_ids).update(is_chunked=True)
+
+
+def chunk_page_range(start_id, end_id, chunk_size=1000, overlap=200, batch_size=1000, read_size=500):
+    """Chunk every page in [start_id, end_id) that is not chunked yet."""
+    stats = {"pages": 0, "chunks": 0}
+    qs = (
+        pages_without_chunks()
+        .filter(id__gte=start_id, id__lt=end_id)
+        .order_by('id')
+        .values_list('id', 'raw_text', 'ocr_text')
+    )
+    buffer = []
+    page_ids = []
+    # iterator() streams rows through a server-side cursor on postgres.
+    for page_id, raw_text, ocr_text in qs.iterator(chunk_size=read_size):
+        text = "\n".join(part for part in (raw_text, ocr_text) if part)
+        for index, chunk in enumerate(split_into_chunks(text, chunk_size, overlap)):
+            buffer.append(TextChunk(
+                pdf_page_id=page_id,
+                chunk_text=chunk,
+                chunk_index=index,
+                text_hash=text_hash(chunk),
+            ))
+
+        stats["pages"] += 1
+        page_ids.append(page_id)
+        if len(buffer) >= batch_size or len(page_ids) >= read_size:
+            stats["chunks"] += len(buffer)
+            flush_chunks(buffer, page_ids)
+            buffer, page_ids = [], []
+
+    if page_ids:
+        stats["chunks"] += len(buffer)
+        flush_chunks(buffer, page_ids)
+    return stats
+
+
+class Command(BaseCommand):
+    help = "Splits PDFPage text into overlapping TextChunk rows, only for pages that are not chunked yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk_size', type=int, default=1000,
+            help='Maximum characters per chunk.',
+        )
+        parser.add_argument(
+            '--overlap', type=int, default=200,
+            help='Characters shared between consecutive chunks of a page.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Processes to run, each one chunks its own page-id range.',
+        )
+        parser.add_argument(
+            '--ranges_per_worker', type=int, default=4,
+            help='The page-id space is split into workers x ranges_per_worker ranges to even out load.',
+        )
+        parser.add_argument(
+            '--batch_size', type=int, default=1000,
+            help='Chunks per bulk insert.',
+        )
+        parser.add_argument(
+            '--read_size', type=int, default=500,
+            help='Pages fetched per round-trip of the server-side cursor.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        overlap = options['overlap']
+        if overlap >= chunk_size:
+            self.stdout.write(self.style.ERROR("--overlap must be smaller than --chunk_size"))
+            return
+
+        bounds = pages_without_chunks().aggregate(start=Min('id'), end=Max('id'))
+        if bounds['start'] is None:
+            self.stdout.write(self.style.SUCCESS("All pages are already chunked."))
+            return
+
+        workers = options['workers']
+        range_count = max(workers * options['ranges_per_worker'], 1)
+        start, end = bounds['start'], bounds['end'] + 1
+        step = max((end - start) // range_count + 1, 1)
+        ranges = [(low, min(low + step, end)) for low in range(start, end, step)]
+        kwargs = {
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "batch_size": options['batch_size'],
+            "read_size": options['read_size'],
+        }
+
+        started = time()
+        total_pages = total_chunks = 0
+        # Don't hand our open connection over to the forked workers.
+        db.connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("fork"),
+            initializer=db.connections.close_all,
+        ) as executor:
+            futures = {
+                executor.submit(chunk_page_range, low, high, **kwargs): (low, high)
+                for low, high in ranges
+            }
+            for future in as_completed(futures):
+                low, high = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(get_traceback(e))
+                    self.stdout.write(self.style.ERROR(f"[X] Error chunking pages {low}-{high}: {e}"))
+                    continue
+
+                total_pages += stats["pages"]
+                total_chunks += stats["chunks"]
+                self.stdout.write(self.style.SUCCESS(
+                    f"[✓] Pages {low}-{high}: {stats['pages']} pages, {stats['chunks']} chunks"
+                ))
+
+        elapsed = (time() - started) or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"Chunked {total_pages} pages into {total_chunks} chunks in {elapsed:.1f}s "
+            f"({total_pages / elapsed:.1f} pages/s)"
+        ))
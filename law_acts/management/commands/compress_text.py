@@ -0,0 +1,118 @@
+from time import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from law_acts.compression import (
+    compress_text,
+    current_dict_id,
+    decompress_text,
+    frame_dict_id,
+    load_dictionaries,
+    train_dictionary,
+)
+from law_acts.fields import CompressedTextField
+from law_acts.models import CompressionDictionary, Document, IndianKanoon, PDFPage, TextChunk
+
+COMPRESSED_MODELS = [Document, IndianKanoon, PDFPage, TextChunk]
+
+
+def compressed_columns():
+    for model in COMPRESSED_MODELS:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, CompressedTextField):
+                yield model, field
+
+
+class Command(BaseCommand):
+    help = "Trains the zstd dictionary for compressed text columns and rewrites existing rows with it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--train', action='store_true',
+            help='Train a new dictionary from samples of every compressed column.',
+        )
+        parser.add_argument('--samples', type=int, default=5000, help='Samples per column used for training.')
+        parser.add_argument('--dict_size', type=int, default=112640, help='Dictionary size in bytes.')
+        parser.add_argument(
+            '--rewrite', action='store_true',
+            help='Recompress every row not already compressed with the newest dictionary.',
+        )
+        parser.add_argument('--batch_size', type=int, default=1000, help='Rows rewritten per round-trip.')
+
+    def handle(self, *args, **options):
+        if options['train']:
+            self.train(options['samples'], options['dict_size'])
+        if options['rewrite']:
+            self.rewrite(options['batch_size'])
+
+    def train(self, samples_per_column, dict_size):
+        samples = []
+        with connection.cursor() as cursor:
+            for model, field in compressed_columns():
+                cursor.execute(
+                    f'SELECT "{field.column}" FROM "{model._meta.db_table}" '
+                    f'WHERE "{field.column}" IS NOT NULL ORDER BY random() LIMIT %s',
+                    [samples_per_column],
+                )
+                samples += [decompress_text(value) for value, in cursor.fetchall()]
+
+        samples = [sample for sample in samples if sample]
+        dictionary = train_dictionary(samples, dict_size)
+        CompressionDictionary.objects.create(
+            dict_id=dictionary.dict_id(),
+            data=dictionary.as_bytes(),
+            sample_count=len(samples),
+        )
+        load_dictionaries(force=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained dictionary {dictionary.dict_id()} ({len(dictionary.as_bytes())} bytes) from {len(samples)} samples"
+        ))
+
+    def rewrite(self, batch_size):
+        dict_id = current_dict_id()
+        for model, field in compressed_columns():
+            table, column = model._meta.db_table, field.column
+            started = time()
+            last_id = 0
+            rows = bytes_before = bytes_after = 0
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'SELECT id, "{column}" FROM "{table}" WHERE id > %s AND "{column}" IS NOT NULL '
+                        f'ORDER BY id LIMIT %s',
+                        [last_id, batch_size],
+                    )
+                    batch = cursor.fetchall()
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                updates = []
+                for row_id, value in batch:
+                    value = bytes(value)
+                    if frame_dict_id(value) == dict_id:
+                        continue
+                    compressed = compress_text(decompress_text(value))
+                    bytes_before += len(value)
+                    bytes_after += len(compressed)
+                    updates.append((row_id, compressed))
+
+                if updates:
+                    # One UPDATE .. FROM (VALUES ..) per batch.
+                    values = ", ".join(["(%s, %s)"] * len(updates))
+                    params = [param for update in updates for param in update]
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f'UPDATE "{table}" SET "{column}" = v.data '
+                            f'FROM (VALUES {values}) AS v(id, data) WHERE "{table}".id = v.id',
+                            params,
+                        )
+                    rows += len(updates)
+
+            saved = bytes_before - bytes_after
+            ratio = (saved / bytes_before * 100) if bytes_before else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"[{table}.{column}] rewrote {rows} rows in {time() - started:.1f}s: "
+                f"{bytes_before / 1e6:.1f}MB -> {bytes_after / 1e6:.1f}MB, saved {saved / 1e6:.1f}MB ({ratio:.1f}%)"
+            ))
+
+        self.stdout.write("Run VACUUM (FULL) on the rewritten tables to return the freed space to the OS.")
@@ -0,0 +1,94 @@
+from time import time
+from django.core.management.base import BaseCommand, CommandError
+from law_acts.embeddings import embed_texts, get_model, pin_threads, text_hash
+from law_acts.models import TextChunk
+
+
+class Command(BaseCommand):
+    help = "Fills TextChunk.vector_embedding for chunks that have none, using a local CPU model."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch_size', type=int, default=2048,
+            help='Chunks read, embedded and written back per round.',
+        )
+        parser.add_argument(
+            '--encode_batch_size', type=int, default=256,
+            help='Texts per forward pass of the model.',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=None,
+            help='Pin torch/BLAS to this many threads, defaults to the library default (all cores).',
+        )
+        parser.add_argument(
+            '--model', type=str, default=None,
+            help='sentence-transformers model name, defaults to settings.EMBEDDING_MODEL.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        encode_batch_size = options['encode_batch_size']
+        model_name = options['model']
+        if options['threads']:
+            pin_threads(options['threads'])
+
+        try:
+            get_model(model_name)
+        except ImportError:
+            raise CommandError("sentence-transformers is required: pip install sentence-transformers")
+
+        started = time()
+        last_id = 0
+        total = embedded = reused = 0
+        while True:
+            # Keyset pagination, no OFFSET scans as the null set shrinks.
+            rows = list(
+                TextChunk.objects
+                .filter(vector_embedding__isnull=True, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'chunk_text', 'text_hash')[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            hashes = [hash_ or text_hash(chunk_text) for _, chunk_text, hash_ in rows]
+            # Byte-identical text that was already embedded is copied, not recomputed.
+            vectors = dict(
+                TextChunk.objects
+                .filter(text_hash__in=set(hashes), vector_embedding__isnull=False)
+                .order_by('text_hash')
+                .distinct('text_hash')
+                .values_list('text_hash', 'vector_embedding')
+            )
+            reused += sum(1 for hash_ in hashes if hash_ in vectors)
+
+            pending = {}
+            for (_, chunk_text, _), hash_ in zip(rows, hashes):
+                if hash_ not in vectors:
+                    pending.setdefault(hash_, chunk_text)
+            if pending:
+                vectors.update(zip(pending, embed_texts(list(pending.values()), encode_batch_size, model_name)))
+                embedded += len(pending)
+
+            TextChunk.objects.bulk_update(
+                [
+                    TextChunk(id=chunk_id, text_hash=hash_, vector_embedding=vectors[hash_])
+                    for (chunk_id, _, _), hash_ in zip(rows, hashes)
+                ],
+                ['text_hash', 'vector_embedding'],
+                batch_size=500,
+            )
+
+            total += len(rows)
+            elapsed = (time() - started) or 1e-9
+            self.stdout.write(self.style.SUCCESS(
+                f"[✓] Up to id {last_id}: {total} chunks, {embedded} embedded, {reused} reused, "
+                f"{total / elapsed:.1f} chunks/s"
+            ))
+
+        elapsed = (time() - started) or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedded {total} chunks in {elapsed:.1f}s ({total / elapsed:.1f} chunks/s), "
+            f"model calls: {embedded}, reused: {reused}"
+        ))
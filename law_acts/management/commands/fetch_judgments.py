@@ -0,0 +1,127 @@
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import time
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from law_acts.models import IndianKanoon
+from nyaya_ai.http_client import HttpClient
+from nyaya_ai.rate_limiter import limiter_report
+from nyaya_ai.utils import fetch_time, get_traceback, parse_decision_date
+
+
+class Command(BaseCommand):
+    help = "Fetches judgment text for IndianKanoon result rows that have not been fetched yet."
+    domain = "https://indiankanoon.org"
+    content_css = ["div.judgments", "div.doc_content", "pre"]
+    client = HttpClient(headers={"Referer": domain})
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max_workers', type=int, default=20,
+            help='Concurrent page fetches in this process.',
+        )
+        parser.add_argument(
+            '--batch_size', type=int, default=200,
+            help='Rows claimed, fetched and written back per round.',
+        )
+        parser.add_argument(
+            '--lease_minutes', type=int, default=30,
+            help='Claims older than this are considered abandoned and can be taken by another worker.',
+        )
+
+    def handle(self, *args, **options):
+        max_workers = options['max_workers']
+        batch_size = options['batch_size']
+        self.lease = timedelta(minutes=options['lease_minutes'])
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.client.max_per_host = max_workers
+
+        started = time()
+        last_id = 0
+        fetched = failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                rows = self.claim_rows(last_id, batch_size)
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                updates = []
+                results = executor.map(self.fetch_judgment, [url for _, url, _ in rows])
+                for (row_id, url, row_date), (content, decision_date) in zip(rows, results):
+                    row = IndianKanoon(id=row_id, date=row_date, claimed_by=None, claimed_at=None)
+                    if content is not None:
+                        row.content = content
+                        # Rows found by a multi day search may not have a date yet.
+                        row.date = row_date or decision_date
+                        row.is_fetched = True
+                        row.fetched_at = fetch_time()
+                        fetched += 1
+                    else:
+                        failed += 1
+                    updates.append(row)
+
+                # Failed rows only have their claim released so a later run retries them.
+                IndianKanoon.objects.bulk_update(
+                    [row for row in updates if row.is_fetched],
+                    ['content', 'date', 'is_fetched', 'fetched_at', 'claimed_by', 'claimed_at'],
+                    batch_size=batch_size,
+                )
+                IndianKanoon.objects.filter(
+                    id__in=[row.id for row in updates if not row.is_fetched]
+                ).update(claimed_by=None, claimed_at=None)
+
+                elapsed = (time() - started) or 1e-9
+                self.stdout.write(self.style.SUCCESS(
+                    f"[{self.worker}] up to id {last_id}: {fetched} fetched, {failed} failed, "
+                    f"{fetched / elapsed:.1f} rows/s, host limit {self.client.limiter(self.domain).stats()}"
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f"[{self.worker}] Done, {fetched} judgments fetched, {failed} failed"))
+        self.stdout.write(self.style.SUCCESS(f"[RATE] {limiter_report()}"))
+
+    def claim_rows(self, last_id, batch_size):
+        """
+        Claim the next `batch_size` unfetched rows after `last_id`. SKIP LOCKED
+        plus the claimed_by/claimed_at lease keep concurrent workers, on this
+        host or others, from fetching the same rows.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                IndianKanoon.objects
+                .select_for_update(skip_locked=True)
+                .filter(is_page_url=False, is_fetched=False, id__gt=last_id)
+                .exclude(claimed_at__gt=now - self.lease)
+                .order_by('id')
+                .values_list('id', 'url', 'date')[:batch_size]
+            )
+            IndianKanoon.objects.filter(id__in=[row_id for row_id, _, _ in rows]).update(
+                claimed_by=self.worker, claimed_at=now,
+            )
+        return rows
+
+    def fetch_judgment(self, url):
+        """(text, decision date from the page title) of a judgment, (None, None) on failure."""
+        try:
+            response = self.client.get(url)
+        except Exception as e:
+            print(get_traceback(e))
+            return None, None
+
+        if response.status_code != 200:
+            self.stdout.write(self.style.ERROR(f"[X] Failed to fetch {url}, Status Code: {response.status_code}"))
+            return None, None
+
+        soup = BeautifulSoup(response.text, "lxml")
+        title = soup.select_one("title")
+        decision_date = parse_decision_date(title.get_text(strip=True)) if title else None
+        for css in self.content_css:
+            tag = soup.select_one(css)
+            if tag:
+                return tag.get_text("\n", strip=True), decision_date
+        return (soup.body.get_text("\n", strip=True) if soup.body else ""), decision_date
@@ -1,19 +1,105 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from law_acts.jobs import enqueue
 from law_acts.models import IndianKanoon
 from bs4 import BeautifulSoup
+from requests import HTTPError
 from urllib.parse import urlencode
 from time import time
-from datetime import datetime
-from nyaya_ai.utils import normalize_text, headers, generate_dates
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from requests import get as getReq
+from datetime import date, datetime, timedelta
+import json
+import re
+from math import ceil
+from hashlib import blake2b
+from threading import Lock
+from nyaya_ai.http_client import HttpClient
+from nyaya_ai.rate_limiter import limiter_report
+from nyaya_ai.utils import normalize_text, generate_dates, parse_decision_date, run_frontier
+from concurrent.futures import ThreadPoolExecutor
+
+TITLE_LENGTH = IndianKanoon._meta.get_field("title").max_length
+
+
+def encode_arg(arg):
+    return {"date": arg.isoformat()} if isinstance(arg, date) else arg
+
+
+def decode_arg(arg):
+    return date.fromisoformat(arg["date"]) if isinstance(arg, dict) and "date" in arg else arg
+
+
+def task_job(task, max_results):
+    """A (fn, *args) frontier task as a `kanoon_task` job."""
+    fn, *args = task
+    args = [encode_arg(arg) for arg in args]
+    payload = {"task": fn.__name__, "args": args, "max_results": max_results}
+    return "kanoon_task", payload, f"kanoon:{fn.__name__}:{json.dumps(args)}"
+
+
+_job_command = None
+_job_command_lock = Lock()
+
+
+def kanoon_job(payload):
+    """
+    `kanoon_task` job handler, run by `manage.py worker`. Each worker process
+    keeps one command instance with the known URLs loaded, rows are written
+    per page so they are committed before the job is marked done. Follow-up
+    pages and split windows are returned as new jobs.
+    """
+    global _job_command
+    with _job_command_lock:
+        if _job_command is None:
+            command = Command()
+            command.setup(batch_size=1, max_results=payload.get("max_results", 400), raise_errors=True)
+            _job_command = command
+    fn = getattr(_job_command, payload["task"])
+    follow_ups = fn(*[decode_arg(arg) for arg in payload["args"]]) or []
+    return [task_job(task, _job_command.max_results) for task in follow_ups]
+
+
+def url_key(url):
+    # 64-bit digest instead of the URL itself keeps millions of known URLs
+    # in a few hundred MB, collisions are negligible at this size.
+    return int.from_bytes(blake2b(url.encode(), digest_size=8).digest(), "big")
+
 
 class Command(BaseCommand):
     help = "Scrapes indiankanoon.org for Act and Section details"
     domain = "https://indiankanoon.org"
     links_css = 'div.results_middle div.results-list article.result h4.result_title a'
-    updated_headers = headers
-    updated_headers.update({"Referer": domain})
+    results_per_page = 10
+    client = HttpClient(headers={"Referer": domain})
+    doc_types = [
+        "laws",
+        "judgments",
+        "tribunals",
+        "supremecourt",
+        "scorders",
+        "highcourts",
+        "supremecourt,scorders",
+        "supremecourt,scorders,highcourts",
+        "kerala",
+        "bihar-section",
+        "mh-section",
+        "wb-section",
+        "union-section",
+        "gujarat-section",
+        "tn-section",
+        "jk-section",
+        "mp-section",
+        "rajasthan-section",
+    ]
+    author_ids = [
+        "v-ramkumar",
+        "p-r-raman",
+        "k-k-denesan",
+        "m-ramachandran",
+        "j-m-james",
+        "t-b-radhakrishnan",
+        "k-t-sankaran",
+        "r-basant",
+    ]
 
 
     def add_arguments(self, parser):
@@ -41,92 +127,266 @@ class Command(BaseCommand):
             help="end-date to fetch news upto end-date, to fetch news until today pass 'today' .",
         )
 
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=50,
+            help="Search pages whose rows are buffered before being written in one transaction.",
+        )
+
+        parser.add_argument(
+            '--adaptive',
+            action='store_true',
+            help="Crawl wide date windows and split them only while they hold more results than pagination returns.",
+        )
+
+        parser.add_argument(
+            '--window_days',
+            type=int,
+            default=365,
+            help="Initial window size in days for --adaptive.",
+        )
+
+        parser.add_argument(
+            '--max_results',
+            type=int,
+            default=400,
+            help="Results a single search can page through, bounds the pages fetched per search and windows above it are split in --adaptive.",
+        )
+
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help="Queue the searches as jobs for `manage.py worker` processes instead of crawling here.",
+        )
+
 
 
     def handle(self, *args, **options):
         start_date = options.get("start_date", "1-1-1947")
         end_date = options.get("end_date", "today")
         max_workers = options.get("max_workers", 30)
+        self.client.max_per_host = max_workers
+        max_results = options.get("max_results", 400)
 
         date_range = generate_dates(start_date, end_date)
-        futures = []
-        doc_types = [
-            "laws",
-            "judgments",
-            "tribunals",
-            "supremecourt",
-            "scorders",
-            "highcourts",
-            "supremecourt,scorders",
-            "supremecourt,scorders,highcourts",
-            "kerala",
-            "bihar-section",
-            "mh-section",
-            "wb-section",
-            "union-section",
-            "gujarat-section",
-            "tn-section",
-            "jk-section",
-            "mp-section",
-            "rajasthan-section",
-        ]
-        author_ids = [
-            "v-ramkumar",
-            "p-r-raman",
-            "k-k-denesan",
-            "m-ramachandran",
-            "j-m-james",
-            "t-b-radhakrishnan",
-            "k-t-sankaran",
-            "r-basant",
-        ]
+        # Tasks are generated lazily and only `max_workers * 2` are in flight,
+        # so memory stays flat whatever the date range is. Later result pages
+        # and split windows come back from the tasks as new tasks.
+        if options.get("adaptive"):
+            tasks = self.iter_windows(date_range, options.get("window_days", 365))
+        else:
+            tasks = self.iter_search_tasks(date_range)
+
+        if options.get("enqueue"):
+            enqueue(task_job(task, max_results) for task in tasks)
+            self.stdout.write(self.style.SUCCESS("[QUEUE] Searches queued"))
+            return
 
+        self.setup(options.get("batch_size", 50), max_results)
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for date in date_range.to_list():
-                date_str = date.strftime("%d-%m-%Y")
-                for doc_type in doc_types:
-                    futures.append(executor.submit(self.fetch_acts, date_str, extra_filters=f"doctypes:{doc_type}"))
-                
-                    for author_id in author_ids:
-                        futures.append(executor.submit(self.fetch_acts, date_str, extra_filters=f"doctypes:{doc_type} authorid:{author_id}"))
-                        futures.append(executor.submit(self.fetch_acts, date_str, extra_filters=f"doctypes:{doc_type} benchid:{author_id}"))
-                        futures.append(executor.submit(self.fetch_acts, date_str, extra_filters=f"authorid:{author_id}"))
-                        futures.append(executor.submit(self.fetch_acts, date_str, extra_filters=f"benchid:{author_id}"))
-
-        for future in as_completed(futures):
-            pass
-
-
-    def fetch_acts(self, date:str, page=0, extra_filters=""):
+            for (fn, *args), future in run_frontier(executor, tasks, max_workers * 2):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"[X] {fn.__name__}{tuple(args)}: {e}"))
+
+        self.flush_rows(self.pending_pages, self.pending_links)
+        self.stdout.write(self.style.SUCCESS(f"[RATE] {limiter_report()}"))
+
+    def setup(self, batch_size, max_results, raise_errors=False):
+        self.batch_size = batch_size
+        self.max_results = max_results
+        # In job mode a failed page raises, so the queue retries it instead of marking it done.
+        self.raise_errors = raise_errors
+        self.lock = Lock()
+        self.pending_pages = []
+        self.pending_links = []
+        self.load_known_urls()
+
+    def iter_windows(self, date_range, window_days):
+        start, end = date_range[0].date(), date_range[-1].date()
+        while start <= end:
+            window_end = min(start + timedelta(days=window_days - 1), end)
+            yield self.crawl_window, start, window_end, ""
+            start = window_end + timedelta(days=1)
+
+    def crawl_window(self, from_date, to_date, extra_filters=""):
+        """
+        Search a date window; if it has more results than pagination can
+        return, hand back its halves as new tasks. A single day that is still
+        too big is split by doc type instead.
+        """
+        date, to_date_str = from_date.strftime("%d-%m-%Y"), to_date.strftime("%d-%m-%Y")
+        result = self.fetch_acts(date, 0, extra_filters, to_date=to_date_str, max_results=self.max_results, replay=True)
+        if result is None:
+            return []
+
+        count, has_next = result
+        if count is None or count <= self.max_results:
+            return self.page_tasks(date, extra_filters, to_date_str, count, has_next)
+
+        if from_date < to_date:
+            middle = from_date + (to_date - from_date) // 2
+            return [
+                (self.crawl_window, from_date, middle, extra_filters),
+                (self.crawl_window, middle + timedelta(days=1), to_date, extra_filters),
+            ]
+
+        if not extra_filters:
+            return [(self.crawl_window, from_date, to_date, f"doctypes:{doc_type}") for doc_type in self.doc_types]
+
+        # Nothing left to split on, take what pagination gives.
+        return [(self.search_page, date, 0, extra_filters, to_date_str)]
+
+    def search_page(self, date, page=0, extra_filters="", to_date=None, walk=False):
+        """Fetch one result page of a search, returns the tasks for its other pages."""
+        result = self.fetch_acts(date, page, extra_filters, to_date=to_date, replay=page == 0 or walk)
+        if result is None:
+            return []
+
+        count, has_next = result
+        if page == 0 and not walk:
+            return self.page_tasks(date, extra_filters, to_date, count, has_next)
+        if walk and has_next:
+            return [(self.search_page, date, page + 1, extra_filters, to_date, True)]
+        return []
+
+    def page_tasks(self, date, extra_filters, to_date, count, has_next):
+        """
+        Tasks for pages 1.. of a search whose first page was just fetched.
+        With a known result count they are all handed out at once so they are
+        fetched concurrently, otherwise the pages are walked one by one.
+        """
+        if count is None:
+            return [(self.search_page, date, 1, extra_filters, to_date, True)] if has_next else []
+
+        pages = min(ceil(count / self.results_per_page), ceil(self.max_results / self.results_per_page))
+        return [(self.search_page, date, page, extra_filters, to_date) for page in range(1, pages)]
+
+    def result_count(self, soup:BeautifulSoup):
+        """Total hits from the '1 - 10 of 1,234' header of a search page."""
+        header = soup.select_one('div.results_middle') or soup
+        match = re.search(r"\bof\s+(?:about\s+)?([\d,]+)", header.get_text(" ", strip=True))
+        if match:
+            return int(match.group(1).replace(",", ""))
+        return None
+
+    def load_known_urls(self):
+        """Preload every stored URL so membership checks never hit the DB."""
+        self.known_urls = set()
+        self.fetched_pages = set()
+        rows = IndianKanoon.objects.values_list("url", "is_page_url", "is_fetched")
+        for url, is_page_url, is_fetched in rows.iterator(chunk_size=10000):
+            key = url_key(url)
+            self.known_urls.add(key)
+            if is_page_url and is_fetched:
+                self.fetched_pages.add(key)
+        self.stdout.write(f"Loaded {len(self.known_urls)} known urls, {len(self.fetched_pages)} fetched pages")
+
+    def queue_rows(self, page_row, link_rows):
+        """Buffer a fetched search page with its new links, flushing every `batch_size` pages."""
+        with self.lock:
+            self.pending_pages.append(page_row)
+            self.pending_links += link_rows
+            if len(self.pending_pages) < self.batch_size:
+                return
+            pages, links = self.pending_pages, self.pending_links
+            self.pending_pages, self.pending_links = [], []
+        self.flush_rows(pages, links)
+
+    def flush_rows(self, pages, links):
+        # Links and the pages marking them fetched commit together, so a crash
+        # never leaves a page fetched without its links.
+        try:
+            with transaction.atomic():
+                IndianKanoon.objects.bulk_create(links, ignore_conflicts=True)
+                IndianKanoon.objects.bulk_create(
+                    list({page.url: page for page in pages}.values()),
+                    update_conflicts=True,
+                    unique_fields=["url"],
+                    update_fields=["title", "is_fetched", "fetched_at", "result_count", "has_next"],
+                )
+        except Exception:
+            # Nothing was stored, let a later page or run pick these links up again.
+            with self.lock:
+                self.known_urls.difference_update(url_key(link.url) for link in links)
+            raise
+        # Only a committed page counts as fetched.
+        with self.lock:
+            self.fetched_pages.update(url_key(page.url) for page in pages)
+
+    def iter_search_tasks(self, date_range):
+        """Yield a first-page task for every search to run, one date at a time."""
+        for date in date_range:
+            date_str = date.strftime("%d-%m-%Y")
+            for doc_type in self.doc_types:
+                yield self.search_page, date_str, 0, f"doctypes:{doc_type}"
+                for author_id in self.author_ids:
+                    yield self.search_page, date_str, 0, f"doctypes:{doc_type} authorid:{author_id}"
+                    yield self.search_page, date_str, 0, f"doctypes:{doc_type} benchid:{author_id}"
+
+            # Author/bench only filters don't depend on the doc type, run them once per date.
+            for author_id in self.author_ids:
+                yield self.search_page, date_str, 0, f"authorid:{author_id}"
+                yield self.search_page, date_str, 0, f"benchid:{author_id}"
+
+
+    def fetch_acts(self, date:str, page=0, extra_filters="", to_date=None, max_results=None, replay=False):
+        """
+        Fetch a search page and store its links, returns (result count, has
+        next page), or None if the page failed or was already fetched. With
+        `replay`, an already fetched page returns its stored count instead,
+        or is fetched again if it was stored without one, so a search
+        interrupted after its first page still gets its other pages
+        scheduled. With `max_results`, a first page over that count is
+        not stored so the caller can split the search.
+        """
+        to_date = to_date or date
         params = {
-            "formInput": f"fromdate:{date} todate:{date} {extra_filters}",
+            "formInput": f"fromdate:{date} todate:{to_date} {extra_filters}",
             "pagenum": page,
         }
         full_url = f"{self.domain}/search/?{urlencode(params)}"
-        date_obj = datetime.strptime(date, "%d-%m-%Y").date()
-        filters = {"url": full_url, "is_page_url": True}
-
-        indian_kanoon : IndianKanoon = IndianKanoon.objects.filter(**filters).first()
-        if not indian_kanoon:
-            filters['date'] = date_obj
-            indian_kanoon : IndianKanoon = IndianKanoon.objects.create(**filters)
+        # Rows from a multi day window have no single date.
+        date_obj = datetime.strptime(date, "%d-%m-%Y").date() if to_date == date else None
+        page_key = url_key(full_url)
+        if page_key in self.fetched_pages:
+            if not replay:
+                return None
+            stored = self.stored_result(full_url)
+            if stored is not None:
+                return stored
+            # Fetched before counts were recorded, fetch it again so its other
+            # pages get scheduled.
 
-        if indian_kanoon.is_fetched:
-            return True
-
-        response = getReq(full_url, headers=self.updated_headers)
+        response = self.client.get(full_url)
         code = response.status_code
         if code != 200:
+            if self.raise_errors:
+                raise HTTPError(f"Status Code: {code} for {full_url}", response=response)
             self.stdout.write(self.style.ERROR(f"[X] Failed to fetch {full_url}, Status Code: {code}"))
-            return False
+            return None
 
         soup = BeautifulSoup(response.text, "lxml")
-        indian_kanoon.title = soup.select_one('title').get_text()
-        indian_kanoon.is_fetched = True
-        indian_kanoon.fetched_at = int(time())
-        indian_kanoon.save()
+        count = self.result_count(soup)
+        has_next = self.has_next_page(soup)
+        if max_results and page == 0 and count is not None and count > max_results:
+            return count, has_next
+
+        page_row = IndianKanoon(
+            url=full_url,
+            date=date_obj,
+            title=soup.select_one('title').get_text()[:TITLE_LENGTH],
+            is_page_url=True,
+            is_fetched=True,
+            fetched_at=int(time()),
+            result_count=count,
+            has_next=has_next,
+        )
 
         self.stdout.write(self.style.SUCCESS(f"[✓] Fetched {full_url}"))
+        link_rows = []
         links = soup.select(self.links_css)
         for link_tag in links:
             link_href = link_tag.attrs.get("href", None)
@@ -137,19 +397,33 @@ class Command(BaseCommand):
             if not link_href.startswith("http"):
                 link_href = f"{self.domain}{link_href}"
 
+            key = url_key(link_href)
+            with self.lock:
+                if key in self.known_urls:
+                    continue
+                self.known_urls.add(key)
+
             title = link_tag.get_text(strip=True)
-            if not IndianKanoon.objects.filter(url=link_href).exists():
-                IndianKanoon.objects.create(
-                    title = title,
-                    url = link_href,
-                    date = date_obj,
-                    is_page_url = False,
-                )
+            link_rows.append(IndianKanoon(
+                title = title[:TITLE_LENGTH],
+                url = link_href,
+                # Results of a multi day window carry their own date in the title.
+                date = date_obj or parse_decision_date(title),
+                is_page_url = False,
+            ))
+
+        self.queue_rows(page_row, link_rows)
 
-        if self.has_next_page(soup):
-            self.fetch_acts(date, page + 1)
+        return count, has_next
     
 
+    def stored_result(self, url):
+        """(result count, has next page) recorded for a fetched page, None for rows stored before they were."""
+        row = IndianKanoon.objects.filter(url=url).values_list("result_count", "has_next").first()
+        if row is None or row == (None, None):
+            return None
+        return row
+
     def has_next_page(self, soup:BeautifulSoup):
         tag = soup.find(lambda t: t.name and t.get_text(strip=True).lower() == "next")
         return bool(tag)
\ No newline at end of file
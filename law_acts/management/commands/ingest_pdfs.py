@@ -1,112 +1,519 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from threading import current_thread
+from time import time
 import os
-from glob import glob
+from django.conf import settings
+from django import db
+from django.db import IntegrityError, transaction
 from django.core.management.base import BaseCommand
+from law_acts.jobs import enqueue
 from law_acts.models import PDFDocument, PDFImage, PDFPage
+from law_acts.manifest import IngestManifest, iter_pdf_files
+from law_acts.ocr_cache import OCRCache, image_hash
 import fitz
 import pytesseract
 from PIL import Image
 import io
-from nyaya_ai.utils import get_traceback
-    
+from nyaya_ai.utils import file_sha256, get_traceback, submit_bounded
 
-class Command(BaseCommand):
-    help = "Ingests PDFs from a directory or a single file into the database."
-    pdf_files = []
+CACHE_COUNTERS = ("memory_hits", "db_hits", "misses")
+OCR_OPTIONS = {
+    "min_image_area": 10000,
+    "text_layer_min_chars": 200,
+    "scan_coverage": 0.8,
+    "ocr_dpi": 300,
+}
+ocr_cache = OCRCache()
 
-    def add_arguments(self, parser):
-        parser.add_argument(
-            '--path', type=str, required=True,
-            help='Path to a PDF file or a directory containing PDFs.',
-        )
-        parser.add_argument(
-            '--max_workers', type=int, default=30,
-            help='Number of workers to use for processing PDFs.'
-        )
 
+def init_worker(ocr_cache_size=10000):
+    # Forked workers inherit the parent's DB socket, drop it so every
+    # process opens its own connection on its first query.
+    db.connections.close_all()
+    ocr_cache.max_size = ocr_cache_size
 
-    def _list_pdf_files(self):
-        if not os.path.exists(self.path):
-            self.stdout.write(self.style.ERROR(f"The directory {self.path} does not exist."))
-            return []
-            
-        self.pdf_files = glob(os.path.join(self.path, '**', '*.pdf'), recursive=True)
-        
-        
 
-    def handle(self, *args, **options):
-        self.path = options.get('path')
-        self.max_workers = options.get('max_workers', 10)
+def worker_name():
+    return f"pid-{os.getpid()}/{current_thread().name}"
 
-        self._list_pdf_files()
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [executor.submit(self.process_pdf, pdf_path) for pdf_path in self.pdf_files]
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    print(get_traceback(e))
-                    self.stdout.write(self.style.ERROR(f"[X] Error processing {pdf_path}: {e}"))
-                    break
 
+def ocr_image(image_bytes):
+    # Use PIL to open the image for OCR
+    image = Image.open(io.BytesIO(image_bytes))
+    return pytesseract.image_to_string(image)
+
+
+def ocr_images(images, ocr_pool, stats):
+    """OCR a page's images, running tesseract only for hashes not in the cache."""
+    hashes = [image_hash(image_bytes) for image_bytes in images]
+    found, counts = ocr_cache.lookup(list(dict.fromkeys(hashes)))
+    for key in CACHE_COUNTERS:
+        stats[key] += counts[key]
+
+    missing = {}
+    for key, image_bytes in zip(hashes, images):
+        if key not in found:
+            missing[key] = image_bytes
+
+    if missing:
+        ocr_map = ocr_pool.map if ocr_pool else map
+        computed = dict(zip(missing, ocr_map(ocr_image, missing.values())))
+        ocr_cache.store(computed)
+        found.update(computed)
+
+    return [found[key] for key in hashes]
+
+
+def classify_page(page, raw_text, image_list, ocr_options):
+    """
+    Decide what on a page is worth sending to tesseract:
+    - "text": the text layer already has the content, OCR nothing
+    - "scanned": no text layer and the images cover the page, render the
+      page once at `ocr_dpi` instead of OCR-ing every image
+    - "images": OCR only the images bigger than `min_image_area` pixels
+    Returns the page type and the xrefs to OCR.
+    """
+    text_chars = len(raw_text.strip())
+    if text_chars >= ocr_options["text_layer_min_chars"]:
+        return "text", []
+
+    if not text_chars and image_list:
+        page_area = abs(page.rect) or 1
+        image_area = sum(abs(fitz.Rect(info["bbox"])) for info in page.get_image_info())
+        if image_area / page_area >= ocr_options["scan_coverage"]:
+            return "scanned", []
+
+    xrefs = [
+        img[0] for img in image_list
+        if img[2] * img[3] >= ocr_options["min_image_area"]
+    ]
+    return "images", xrefs
 
-    
-    def process_pdf(self, file_path):
-        filename = os.path.basename(file_path)
+
+def flush_pages(pdf_doc_model, page_buffer, batch_size):
+    """
+    Write buffered pages and their images in one transaction, moving the
+    document's `last_page` checkpoint forward in the same transaction.
+    """
+    if not page_buffer:
+        return
+
+    last_page = page_buffer[-1][0].page_number
+    with transaction.atomic():
+        PDFPage.objects.bulk_create([page for page, _ in page_buffer], batch_size=batch_size or None)
+        PDFImage.objects.bulk_create(
+            [image for _, images in page_buffer for image in images],
+            batch_size=batch_size or None,
+        )
+        PDFDocument.objects.filter(pk=pdf_doc_model.pk).update(last_page=last_page)
+    pdf_doc_model.last_page = last_page
+    page_buffer.clear()
+
+
+def get_pdf_document(file_path, sha256):
+    """
+    The PDFDocument for a file, looked up by content first so copies of one
+    PDF share a row. Rows from before hashes were recorded are matched on
+    path and get their hash filled in.
+    """
+    pdf_doc_model = PDFDocument.objects.filter(sha256=sha256).first()
+    if pdf_doc_model:
+        return pdf_doc_model
+
+    try:
         pdf_doc_model, created = PDFDocument.objects.get_or_create(
             file_path=file_path,
-            defaults={'original_filename': filename}
+            defaults={'original_filename': os.path.basename(file_path), 'sha256': sha256}
         )
-        if pdf_doc_model.is_processed:
-            self.stdout.write(self.style.WARNING(f"-] PDF {file_path} already processed."))
-            return True
+        if not pdf_doc_model.sha256:
+            pdf_doc_model.sha256 = sha256
+            pdf_doc_model.save(update_fields=["sha256"])
+    except IntegrityError:
+        # A copy of this file was registered by another worker in the meantime.
+        return PDFDocument.objects.get(sha256=sha256)
+    return pdf_doc_model
+
 
-        update_fields = []
-        doc = fitz.open(file_path)
-        total_pages = len(doc)
-        pdf_doc_model.total_pages = total_pages
-        update_fields.append("total_pages")
+def backfill_hashes(batch_size=500):
+    """
+    Hash the files of rows registered before hashes were recorded, so a copy
+    found under another path is matched to them instead of ingested again.
+    When several old rows hold the same bytes, only the first one (processed
+    rows first) takes the hash. Returns the number of rows filled in.
+    """
+    taken = set()
+    updates = []
+    filled = 0
+    rows = (
+        PDFDocument.objects.filter(sha256__isnull=True)
+        .order_by("-is_processed", "id")
+        .values_list("id", "file_path")
+    )
+    for pdf_id, file_path in rows.iterator(chunk_size=batch_size):
+        if not os.path.isfile(file_path):
+            continue
+        sha256 = file_sha256(file_path)
+        if sha256 in taken or PDFDocument.objects.filter(sha256=sha256).exists():
+            continue
+        taken.add(sha256)
+        updates.append(PDFDocument(id=pdf_id, sha256=sha256))
+        if len(updates) >= batch_size:
+            PDFDocument.objects.bulk_update(updates, ["sha256"])
+            filled += len(updates)
+            updates = []
+    PDFDocument.objects.bulk_update(updates, ["sha256"])
+    return filled + len(updates)
+
+
+def process_pdf(file_path, known_hash=None, ocr_threads=1, db_batch_size=100, ocr_options=None):
+    ocr_options = {**OCR_OPTIONS, **(ocr_options or {})}
+    started = time()
+    stats = {
+        "file_path": file_path,
+        "worker": worker_name(),
+        "sha256": file_sha256(file_path),
+        "pages": 0,
+        "skipped": False,
+        "ocr_saved": 0,
+        "resumed_pages": 0,
+        **{key: 0 for key in CACHE_COUNTERS},
+    }
+    # Touched but unchanged since the manifest recorded it, no need to ask the DB.
+    if known_hash and stats["sha256"] == known_hash:
+        stats["skipped"] = True
+        stats["elapsed"] = time() - started
+        return stats
+
+    pdf_doc_model = get_pdf_document(file_path, stats["sha256"])
+    # Another path with the same bytes (the blob store, or the same PDF from
+    # another portal) owns the row, the content is only ingested once.
+    stats["duplicate_of"] = pdf_doc_model.file_path if pdf_doc_model.file_path != file_path else None
+    if pdf_doc_model.is_processed or stats["duplicate_of"]:
+        stats["skipped"] = True
+        stats["elapsed"] = time() - started
+        return stats
+
+    update_fields = []
+    doc = fitz.open(file_path)
+    total_pages = len(doc)
+    pdf_doc_model.total_pages = total_pages
+    update_fields.append("total_pages")
+
+    # tesseract runs as a subprocess, so OCR of a page's images is I/O bound
+    # from python's point of view and can fan out on threads even inside a
+    # worker process.
+    ocr_pool = ThreadPoolExecutor(max_workers=ocr_threads) if ocr_threads > 1 else None
+    # Pages and images are buffered and written with bulk_create, one
+    # transaction per `db_batch_size` pages (0 buffers the whole PDF).
+    page_buffer = []
+    # Pages up to `last_page` were committed by an earlier run, pages after it
+    # may still exist from runs that predate the checkpoint.
+    start_page = min(pdf_doc_model.last_page, total_pages)
+    done_pages = set(
+        pdf_doc_model.pages.filter(page_number__gt=start_page).values_list("page_number", flat=True)
+    )
+    stats["resumed_pages"] = start_page + len(done_pages)
+    try:
+        for page_num in range(start_page, total_pages):
+            if page_num + 1 in done_pages:
+                continue
 
-        for page_num in range(total_pages):
             page = doc.load_page(page_num)
             new_page = page_num+1
 
             # Fetched raw text from the page
             raw_text = page.get_text("text")
-            pdf_page_model = PDFPage.objects.create(
+            pdf_page_model = PDFPage(
                 pdf=pdf_doc_model,
                 page_number=page_num + 1,
                 raw_text=raw_text
             )
-                
+
             # Extract and OCR images
-            ocr_text = ""
             image_list = page.get_images(full=True)
+            page_type, xrefs = classify_page(page, raw_text, image_list, ocr_options)
+            if page_type == "scanned":
+                # A render is unique to its page and its text is stored on the
+                # page already, caching it would only keep a second copy.
+                pixmap = page.get_pixmap(dpi=ocr_options["ocr_dpi"])
+                images = [pixmap.tobytes("png")]
+                ocr_results = [ocr_image(images[0])]
+            else:
+                # PyMuPDF is not thread safe, extract on this thread and only
+                # hand the raw bytes to the OCR pool.
+                images = [doc.extract_image(xref)["image"] for xref in xrefs]
+                ocr_results = ocr_images(images, ocr_pool, stats)
+            stats["ocr_saved"] += len(image_list) - len(images)
 
+            ocr_texts = [
+                f"PAGE:{new_page}\n{result.strip()}\n" if result.strip() else result
+                for result in ocr_results
+            ]
+            image_texts = dict(zip(xrefs, ocr_texts))
+            image_models = []
             for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-
-                # Use PIL to open the image for OCR
-                image = Image.open(io.BytesIO(image_bytes))
-                ocr_text = pytesseract.image_to_string(image)
-                
-                if ocr_text.strip():
-                    ocr_text = f"PAGE:{new_page}\n{ocr_text.strip()}\n"
-                    
-                PDFImage.objects.create(
+                image_models.append(PDFImage(
                     pdf_page=pdf_page_model,
                     image_index=img_index,
-                    ocr_text=ocr_text
-                )
+                    ocr_text=image_texts.get(img[0], "")
+                ))
 
+            ocr_text = "\n".join(text for text in ocr_texts if text.strip())
             if ocr_text:
                 pdf_page_model.ocr_text = ocr_text
-                pdf_page_model.save()
 
+            page_buffer.append((pdf_page_model, image_models))
+            if db_batch_size and len(page_buffer) >= db_batch_size:
+                flush_pages(pdf_doc_model, page_buffer, db_batch_size)
+
+            stats["pages"] += 1
+    finally:
+        if ocr_pool:
+            ocr_pool.shutdown()
+        doc.close()
+
+    with transaction.atomic():
+        flush_pages(pdf_doc_model, page_buffer, db_batch_size)
         pdf_doc_model.is_processed = True
-        update_fields.append("is_processed")
+        pdf_doc_model.last_page = total_pages
+        update_fields += ["is_processed", "last_page"]
         pdf_doc_model.save(update_fields=update_fields)
-        self.stdout.write(self.style.SUCCESS(f"[✓] Successfully processed {file_path}"))
-        return True
\ No newline at end of file
+
+    stats["elapsed"] = time() - started
+    return stats
+
+
+def ingest_pdf_job(payload):
+    """`ingest_pdf` job handler, run by `manage.py worker`."""
+    process_pdf(
+        payload["path"],
+        known_hash=payload.get("known_hash"),
+        db_batch_size=payload.get("db_batch_size", 100),
+        ocr_options=payload.get("ocr_options"),
+    )
+
+
+class Command(BaseCommand):
+    help = "Ingests PDFs from a directory or a single file into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', type=str, required=True,
+            help='Path to a PDF file or a directory containing PDFs.',
+        )
+        parser.add_argument(
+            '--max_workers', type=int, default=30,
+            help='Number of workers to use for processing PDFs.'
+        )
+        parser.add_argument(
+            '--executor', type=str, default='thread', choices=['thread', 'process'],
+            help="Run PDFs on a thread pool or a process pool, 'process' uses all cores for text extraction.",
+        )
+        parser.add_argument(
+            '--ocr_threads', type=int, default=4,
+            help='Threads per worker used to OCR the images of a page, only used with --executor=process.',
+        )
+        parser.add_argument(
+            '--db_batch_size', '--db-batch-size', type=int, default=100,
+            help='Pages buffered per bulk write/transaction and resume checkpoint, 0 writes each PDF in a single transaction.',
+        )
+        parser.add_argument(
+            '--ocr_cache_size', type=int, default=10000,
+            help='OCR results kept in the in-process LRU per worker, 0 only uses the database cache.',
+        )
+        parser.add_argument(
+            '--manifest', type=str, default=os.path.join(settings.RESOURCE_DIR, 'ingest_manifest.jsonl'),
+            help="Manifest of ingested files (path, size, mtime, sha256), pass '' to disable it.",
+        )
+        parser.add_argument(
+            '--min_image_area', type=int, default=OCR_OPTIONS['min_image_area'],
+            help='Images smaller than this many pixels (width x height) are treated as decorative and not OCR-ed.',
+        )
+        parser.add_argument(
+            '--text_layer_min_chars', type=int, default=OCR_OPTIONS['text_layer_min_chars'],
+            help='Pages whose text layer has at least this many characters are not OCR-ed.',
+        )
+        parser.add_argument(
+            '--scan_coverage', type=float, default=OCR_OPTIONS['scan_coverage'],
+            help='Fraction of a page images must cover, with no text layer, for it to be rendered and OCR-ed as a scan.',
+        )
+        parser.add_argument(
+            '--ocr_dpi', type=int, default=OCR_OPTIONS['ocr_dpi'],
+            help='DPI used to render scanned pages for OCR.',
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Queue one job per PDF for `manage.py worker` processes instead of ingesting here.',
+        )
+
+
+    def _iter_pdf_files(self):
+        """Stream (path, known_hash) work items, skipping files the manifest says are unchanged."""
+        # The blob store holds hardlinks of files that are also under their
+        # per-source paths, walking it would register every PDF twice.
+        for file_path, stat in iter_pdf_files(self.path, exclude=[settings.BLOB_DIR]):
+            if self.manifest and self.manifest.is_unchanged(file_path, stat):
+                self.unchanged += 1
+                continue
+
+            entry = self.manifest.get(file_path) if self.manifest else None
+            self.file_stats[file_path] = (stat.st_size, stat.st_mtime)
+            yield file_path, entry["sha256"] if entry else None
+
+    def enqueue_jobs(self, db_batch_size, ocr_options, batch_size=500):
+        queued = processed = 0
+
+        def queue_batch(batch):
+            """Jobs for a batch of files, minus the ones already ingested under that path."""
+            nonlocal queued, processed
+            paths = {file_path: os.path.abspath(file_path) for file_path, _ in batch}
+            done = dict(
+                PDFDocument.objects
+                .filter(file_path__in={*paths, *paths.values()}, is_processed=True, sha256__isnull=False)
+                .values_list("file_path", "sha256")
+            )
+            for file_path, known_hash in batch:
+                size, mtime = self.file_stats.pop(file_path)
+                sha256 = done.get(file_path) or done.get(paths[file_path])
+                if sha256:
+                    # Recorded here since no local run will see the file, the
+                    # next run then skips it without asking the database.
+                    processed += 1
+                    if self.manifest:
+                        self.manifest.record(file_path, size, mtime, sha256)
+                    continue
+
+                queued += 1
+                payload = {
+                    "path": paths[file_path],
+                    "known_hash": known_hash,
+                    "db_batch_size": db_batch_size,
+                    "ocr_options": ocr_options,
+                }
+                yield "ingest_pdf", payload, f"ingest_pdf:{paths[file_path]}"
+
+        def iter_jobs():
+            batch = []
+            for item in self._iter_pdf_files():
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield from queue_batch(batch)
+                    batch = []
+            yield from queue_batch(batch)
+
+        enqueue(iter_jobs())
+        if self.manifest:
+            self.manifest.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"[QUEUE] {queued} PDFs queued, {processed} already ingested and "
+            f"{self.unchanged} unchanged files skipped"
+        ))
+
+    def handle(self, *args, **options):
+        self.path = options.get('path')
+        self.max_workers = options.get('max_workers', 10)
+        self.executor = options.get('executor', 'thread')
+        ocr_threads = options.get('ocr_threads', 4) if self.executor == 'process' else 1
+        db_batch_size = options.get('db_batch_size', 100)
+        ocr_cache_size = options.get('ocr_cache_size', 10000)
+        ocr_cache.max_size = ocr_cache_size
+        ocr_options = {key: options[key] for key in OCR_OPTIONS if options.get(key) is not None}
+
+        if not os.path.exists(self.path):
+            self.stdout.write(self.style.ERROR(f"The directory {self.path} does not exist."))
+            return
+
+        backfilled = backfill_hashes()
+        if backfilled:
+            self.stdout.write(self.style.SUCCESS(f"[DEDUP] hashes filled in for {backfilled} PDFs registered before hashing"))
+
+        self.manifest = IngestManifest(options['manifest']) if options.get('manifest') else None
+        self.file_stats = {}
+        self.unchanged = 0
+
+        if options.get('enqueue'):
+            self.enqueue_jobs(db_batch_size, ocr_options)
+            return
+
+        if self.executor == 'process':
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=get_context("fork"),
+                initializer=init_worker,
+                initargs=(ocr_cache_size,),
+            )
+            # Don't hand our open connection over to the forked workers.
+            db.connections.close_all()
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        started = time()
+        worker_stats = {}
+        cache_stats = dict.fromkeys(CACHE_COUNTERS, 0)
+        ocr_saved = 0
+        duplicates = 0
+        task = partial(process_pdf, ocr_threads=ocr_threads, db_batch_size=db_batch_size, ocr_options=ocr_options)
+        with pool as executor:
+            # Discovery feeds a bounded queue, so work starts on the first file
+            # found and memory does not grow with the size of the tree.
+            for (pdf_path, _), future in submit_bounded(executor, task, self._iter_pdf_files(), self.max_workers * 2):
+                size, mtime = self.file_stats.pop(pdf_path)
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(get_traceback(e))
+                    self.stdout.write(self.style.ERROR(f"[X] Error processing {pdf_path}: {e}"))
+                    continue
+
+                if self.manifest:
+                    self.manifest.record(pdf_path, size, mtime, stats["sha256"])
+                if stats.get("duplicate_of"):
+                    duplicates += 1
+                    self.stdout.write(self.style.WARNING(f"-] PDF {pdf_path} is a copy of {stats['duplicate_of']}."))
+                    continue
+                if stats["skipped"]:
+                    self.stdout.write(self.style.WARNING(f"-] PDF {pdf_path} already processed."))
+                    continue
+
+                for key in CACHE_COUNTERS:
+                    cache_stats[key] += stats[key]
+                ocr_saved += stats["ocr_saved"]
+                worker = worker_stats.setdefault(stats["worker"], {"pdfs": 0, "pages": 0, "elapsed": 0.0})
+                worker["pdfs"] += 1
+                worker["pages"] += stats["pages"]
+                worker["elapsed"] += stats["elapsed"]
+                if stats["resumed_pages"]:
+                    self.stdout.write(self.style.WARNING(
+                        f"-] Resumed {pdf_path}, {stats['resumed_pages']} pages were already ingested."
+                    ))
+                self.stdout.write(self.style.SUCCESS(f"[✓] Successfully processed {pdf_path}"))
+
+        if self.manifest:
+            self.manifest.close()
+        self.stdout.write(f"[MANIFEST] unchanged files skipped: {self.unchanged}")
+        self.stdout.write(f"[DEDUP] copies of already registered PDFs skipped: {duplicates}")
+        self.report_throughput(worker_stats, time() - started)
+        self.stdout.write(self.style.SUCCESS(
+            f"[OCR-CACHE] memory hits: {cache_stats['memory_hits']}, "
+            f"db hits: {cache_stats['db_hits']}, misses: {cache_stats['misses']}"
+        ))
+        self.stdout.write(self.style.SUCCESS(f"[OCR] calls saved by page classification: {ocr_saved}"))
+
+    def report_throughput(self, worker_stats, wall_time):
+        total_pdfs = total_pages = 0
+        for name, worker in sorted(worker_stats.items()):
+            elapsed = worker["elapsed"] or 1e-9
+            total_pdfs += worker["pdfs"]
+            total_pages += worker["pages"]
+            self.stdout.write(
+                f"[{name}] pdfs: {worker['pdfs']}, pages: {worker['pages']}, "
+                f"{worker['pages'] / elapsed:.2f} pages/s, {worker['pdfs'] / elapsed:.3f} pdfs/s"
+            )
+
+        wall_time = wall_time or 1e-9
+        self.stdout.write(self.style.SUCCESS(
+            f"[{self.executor} x {self.max_workers}] pdfs: {total_pdfs}, pages: {total_pages}, "
+            f"{total_pages / wall_time:.2f} pages/s, {total_pdfs / wall_time:.3f} pdfs/s in {wall_time:.1f}s"
+        ))
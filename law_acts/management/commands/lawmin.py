@@ -1,15 +1,19 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from requests import get as getReq
-from nyaya_ai.utils import headers, download_pdf, sanitize_and_shorten
+from nyaya_ai.http_cache import HttpCache
+from nyaya_ai.http_client import HttpClient
+from nyaya_ai.utils import download_pdf, pdf_sha256, sanitize_and_shorten
 from bs4 import BeautifulSoup
 from law_acts.models import Document, Source
 
 class Command(BaseCommand):
     help = 'LawMin Docs'
     domain = 'https://lawmin.gov.in'
-    updated_headers = headers
-    updated_headers.update({'Referer': domain})
+    client = HttpClient(
+        headers={'Referer': domain}, max_per_host=20,
+        cache=HttpCache(settings.HTTP_CACHE_DIR / 'lawmin', ttl=6 * 3600),
+    )
     pdf_urls = []
     save_dir = 'resources/pdfs/lawmin/'
     def handle(self, *args, **options):
@@ -22,6 +26,7 @@ class Command(BaseCommand):
         # self.fetch_archived_notifications()
         # self.save_documents()
         self.download_pdfs()
+        self.stdout.write(self.style.SUCCESS(f'[HTTP-CACHE] {self.client.cache.report()}'))
 
     def save_documents(self):
         source = Source.objects.filter(name='lawmin_documents').first()
@@ -44,7 +49,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f'Successfully saved {pdf_url["pdf_url"]}'))
 
     def fetch_archived_notifications(self):
-        res = getReq(f'{self.domain}/archives-notification', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/archives-notification')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch archived notifications'))
             return
@@ -66,7 +71,7 @@ class Command(BaseCommand):
 
 
     def fetch_demand_grants(self, page=0):
-        res = getReq(f'{self.domain}/documents/demand-for-grants?page={page}', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/documents/demand-for-grants?page={page}')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch demand grants'))
             return
@@ -89,7 +94,7 @@ class Command(BaseCommand):
             
 
     def fetch_speech(self, page=0):
-        res = getReq(f'{self.domain}/speeches-of-ministers?page={page}', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/speeches-of-ministers?page={page}')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch speeches'))
             return
@@ -115,7 +120,7 @@ class Command(BaseCommand):
 
         
     def fetch_annual_reports(self):
-        res = getReq(f'{self.domain}/documents/annualreports', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/documents/annualreports')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch annual reports'))
             return
@@ -137,7 +142,7 @@ class Command(BaseCommand):
 
         
     def fetch_budgets(self):
-        res = getReq(f'{self.domain}/documents/outcomebudgets', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/documents/outcomebudgets')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch budgets'))
             return
@@ -159,7 +164,7 @@ class Command(BaseCommand):
 
 
     def fetch_electoral_reforms(self):
-        res = getReq(f'{self.domain}/documents/electoralreforms', headers=self.updated_headers)
+        res = self.client.get(f'{self.domain}/documents/electoralreforms')
         if res.status_code != 200:
             self.stdout.write(self.style.ERROR('Failed to fetch electoral reforms'))
             return
@@ -183,7 +188,7 @@ class Command(BaseCommand):
     def download_pdfs(self):
         self.stdout.write(self.style.SUCCESS("Downloading PDFs..."))
         qs = Document.objects.filter(source__name="lawmin_documents", document_urls__isnull=False)
-        futures = []
+        futures = {}
         with ThreadPoolExecutor(max_workers=20) as executor:
             for obj in qs.all():
                 pdf_url = obj.document_urls[0]['pdf_url']
@@ -192,11 +197,20 @@ class Command(BaseCommand):
                     "pdf_url": pdf_url,
                     "save_dir": self.save_dir,
                     "filename": filename,
-                    "updated_headers": self.updated_headers,
+                    "client": self.client,
                 }
-                futures.append(executor.submit(download_pdf, item))
+                futures[executor.submit(download_pdf, item)] = obj.id
 
 
+            downloaded = []
             for future in as_completed(futures):
-                pass
-                # self.stdout.write(self.style.SUCCESS(f"Successfully downloaded PDF {future.result()}"))
\ No newline at end of file
+                try:
+                    sha256 = pdf_sha256(future.result())
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Failed to download PDF of document {futures[future]}: {e}'))
+                    continue
+                if sha256:
+                    downloaded.append(Document(id=futures[future], pdf_hashes=[sha256]))
+                # self.stdout.write(self.style.SUCCESS(f"Successfully downloaded PDF {future.result()}"))
+
+        Document.objects.bulk_update(downloaded, ['pdf_hashes'], batch_size=500)
\ No newline at end of file
@@ -2,13 +2,14 @@ from datetime import datetime
 from json import dumps
 
 from django.core.management.base import BaseCommand
-from requests import get as getReq
+from requests import RequestException
 
 from law_acts.choices import SourceTypes
 from law_acts.models import Document, Source
-from nyaya_ai.utils import headers
+from nyaya_ai.http_client import HttpClient
 from concurrent.futures import ThreadPoolExecutor
-from nyaya_ai.utils import download_pdf
+from time import time
+from nyaya_ai.utils import download_pdf, is_downloaded, pdf_save_path, pdf_sha256, submit_bounded
 
 
 
@@ -17,11 +18,27 @@ class Command(BaseCommand):
     default_base_url = "https://www.legislative.gov.in"
     current_date = datetime.now().strftime("%Y-%m-%d")
     taxonomy_categories = []
-    updated_headers = headers
-    updated_headers.update({
+    client = HttpClient(headers={
         "Referer": "https://www.legislative.gov.in/",
     })
     posts = []
+    save_dir = "resources/legislative_docs/"
+    # Directory posts never carry files.
+    document_sources = ["LEGISLATIVE_DOCUMENTS_POST"]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file_batch_size', type=int, default=100,
+            help='File IDs resolved per request to the post endpoint.',
+        )
+        parser.add_argument(
+            '--max_workers', type=int, default=8,
+            help='Concurrent file resolution requests.',
+        )
+        parser.add_argument(
+            '--download_workers', type=int, default=8,
+            help='Documents downloaded concurrently.',
+        )
 
     def handle(self, *args, **options):
         # Fetch Directories
@@ -32,17 +49,16 @@ class Command(BaseCommand):
         self.fetch_taxonomy_categories("tender_category")
         self.fetch_taxonomy_categories("initiative_category")
         self.fetch_all_posts()
-        for post in self.posts:
-            self.fetch_post(post)
+        self.fetch_posts(self.posts, options["file_batch_size"], options["max_workers"])
 
         self.stdout.write(self.style.SUCCESS(f"Total posts fetched: {len(self.posts)}"))
-        self.download_pdfs()
+        self.download_pdfs(options["download_workers"])
 
     def fetch_directory_posts(
         self, count=1000, page=1, order="menu_order", path="directory_post"
     ):
         url = f"{self.default_base_url}/cms/wp-json/post-page/{path}?limit={count}&page={page}&orderby={order}"
-        res = getReq(url, headers=self.updated_headers)
+        res = self.client.get(url)
         if res.status_code != 200:
             self.stdout.write(
                 self.style.ERROR(
@@ -85,7 +101,7 @@ class Command(BaseCommand):
 
     def fetch_taxonomy_categories(self, category_type):
         url = f"{self.default_base_url}/cms/wp-json/taxonomy/{category_type}"
-        res = getReq(url, headers=self.updated_headers)
+        res = self.client.get(url)
         if res.status_code != 200:
             print(f"Failed to fetch categories. Status: {res.status_code}")
             return
@@ -104,7 +120,7 @@ class Command(BaseCommand):
             return
 
         url = f"{self.default_base_url}/cms/wp-json/document/documents?document_category={category_slug}&limit={count}&page={page}&sort=acf&order=DESC&search="
-        res = getReq(url, headers=self.updated_headers)
+        res = self.client.get(url)
         if res.status_code != 200:
             self.stdout.write(
                 self.style.ERROR(
@@ -143,7 +159,7 @@ class Command(BaseCommand):
             return
 
         url = f"{self.default_base_url}/cms/wp-json/post-page/{post_page_source}?limit={count}&page={page}&orderby={order_by}"
-        res = getReq(url, headers=self.updated_headers)
+        res = self.client.get(url)
         if res.status_code != 200:
             self.stdout.write(
                 self.style.ERROR(
@@ -197,13 +213,7 @@ class Command(BaseCommand):
             if cat_type == "initiative_category":
                 self.fetch_post_pages(subcategory, "initiatives", cat_type, order_by="")
 
-    def fetch_post(self, post_obj: dict):
-        post_id = post_obj.get("ID")
-        post_id = post_obj.get("acf_data", {}).get("post_id", post_id)
-        if not post_id:
-            return None
-
-        post_data = {"post_obj": post_obj}
+    def post_file_ids(self, post_obj: dict):
         file_objs = post_obj.get("acf_data", {}).get("file", [])
         fileids = []
         for file_obj in file_objs:
@@ -215,38 +225,59 @@ class Command(BaseCommand):
             ):
                 for id_ in file_obj.get("file", []):
                     fileids.append(str(id_))
-
-        pdf_urls = []
-        if len(fileids) > 0:
-            file_url = f"{self.default_base_url}/cms/wp-json/post-page/post?id={','.join(fileids)}"
-            res = getReq(file_url, headers=self.updated_headers)
-            if res.status_code != 200:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f"Failed to fetch file for post ID {post_id}. Status: {res.status_code}"
-                    )
+        return fileids
+
+    def fetch_files(self, fileids):
+        """Resolve a batch of file IDs in one request, returns {file id: file post} or None on failure."""
+        file_url = f"{self.default_base_url}/cms/wp-json/post-page/post?id={','.join(fileids)}&limit={len(fileids)}"
+        try:
+            res = self.client.get(file_url)
+        except RequestException as e:
+            self.stdout.write(self.style.ERROR(f"Failed to fetch {len(fileids)} files: {e}"))
+            return None
+        if res.status_code != 200:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"Failed to fetch {len(fileids)} files. Status: {res.status_code}"
                 )
+            )
+            return None
 
-                return None
-
-            data = res.json()
-            posts = data.get("posts", [])
-            post_data["file_obj"] = posts
-            if not posts:
-                return None
-
-            if isinstance(posts, list):
-                for post_tmp in posts:
-                    pdf_url = (
-                        post_tmp.get("acf_data", {}).get("pdf", {}).get("url", None)
-                    )
-                    if pdf_url:
-                        pdf_urls.append(pdf_url)
-
-            if isinstance(posts, dict):
-                pdf_url = posts.get("acf_data", {}).get("pdf", {}).get("url", None)
-                if pdf_url:
-                    pdf_urls.append(pdf_url)
+        try:
+            posts = res.json().get("posts", [])
+        except (ValueError, AttributeError) as e:
+            self.stdout.write(self.style.ERROR(f"Bad response for {len(fileids)} files: {e}"))
+            return None
+        if isinstance(posts, dict):
+            posts = [posts]
+        return {str(post.get("ID")): post for post in posts}
+
+    def fetch_posts(self, posts, batch_size=100, max_workers=8):
+        """
+        Resolve the files of every post with batched, concurrent requests to
+        the comma separated `post?id=` endpoint and upsert one Document per post.
+        """
+        post_files = {}
+        for post_obj in posts:
+            post_id = post_obj.get("ID")
+            post_id = post_obj.get("acf_data", {}).get("post_id", post_id)
+            if post_id:
+                post_files[post_id] = (post_obj, self.post_file_ids(post_obj))
+
+        fileids = list(dict.fromkeys(
+            file_id for _, post_fileids in post_files.values() for file_id in post_fileids
+        ))
+        batches = [fileids[i:i + batch_size] for i in range(0, len(fileids), batch_size)]
+        files, failed = {}, set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch, resolved in zip(batches, executor.map(self.fetch_files, batches)):
+                if resolved is None:
+                    failed.update(batch)
+                else:
+                    files.update(resolved)
+        self.stdout.write(self.style.SUCCESS(
+            f"Resolved {len(files)} of {len(fileids)} files in {len(batches)} requests"
+        ))
 
         source_args = {
             "name": "LEGISLATIVE_DOCUMENTS_POST",
@@ -257,46 +288,111 @@ class Command(BaseCommand):
         if not source:
             source = Source.objects.create(**source_args)
 
-        doc_id = f"LEGISLATIVE-DOCUMENT-POST-{post_id}"
+        documents = []
+        for post_id, (post_obj, post_fileids) in post_files.items():
+            file_posts = [files[file_id] for file_id in post_fileids if file_id in files]
+            # Posts whose files could not be fetched are left for the next run.
+            if post_fileids and (failed.intersection(post_fileids) or not file_posts):
+                continue
+
+            pdf_urls = []
+            for post_tmp in file_posts:
+                pdf_url = (
+                    post_tmp.get("acf_data", {}).get("pdf", {}).get("url", None)
+                )
+                if pdf_url:
+                    pdf_urls.append(pdf_url)
 
-        if not Document.objects.filter(doc_id=doc_id).exists():
-            Document.objects.create(
+            post_data = {"post_obj": post_obj}
+            if post_fileids:
+                post_data["file_obj"] = file_posts
+            documents.append(Document(
                 title=post_obj.get("post_title", ""),
-                doc_id=doc_id,
+                doc_id=f"LEGISLATIVE-DOCUMENT-POST-{post_id}",
                 source_id=source.id,
                 document_urls=pdf_urls,
                 response=dumps(post_data),
                 content_type="PDF" if pdf_urls else None,
-            )
+            ))
+
+        Document.objects.bulk_create(
+            documents,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["doc_id"],
+            update_fields=["title", "document_urls", "response", "content_type"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Saved {len(documents)} documents"))
+
+    def download_document(self, doc_id, title, urls, pdf_hashes):
+        """
+        Download the files of one document, returns (document id, hashes,
+        files downloaded) or None if nothing had to be fetched.
+        """
+        # Titles repeat and non latin ones sanitize to nothing, the document
+        # id keeps files of different documents apart, the index those of one.
+        filenames = [f"{title}-{doc_id}-{i}" for i in range(len(urls))]
+        if len(pdf_hashes) == len(urls) and all(
+            is_downloaded(pdf_save_path(self.save_dir, filename), sha256)
+            for filename, sha256 in zip(filenames, pdf_hashes)
+        ):
+            return None
 
-    def download_pdfs(self):
+        hashes = []
+        for url, filename in zip(urls, filenames):
+            item = {
+                "pdf_url": url,
+                "save_dir": self.save_dir,
+                "filename": filename,
+                "formatter": f"PDF-DOWNLOADER-{doc_id}",
+                "client": self.client,
+            }
+            hashes.append(pdf_sha256(download_pdf(item)))
+        return doc_id, hashes, sum(1 for sha256 in hashes if sha256)
+
+    def download_pdfs(self, max_workers=8, batch_size=100):
         self.stdout.write(self.style.SUCCESS("Downloading PDFs..."))
-        qs = Document.objects.filter(document_urls__isnull=False)
-        pdf_urls = []
-        for doc in qs:
-            pdf_urls.append(
-                {
-                    "urls": doc.document_urls,
-                    "save_dir": "resources/legislative_docs/",
-                    "filename": doc.title,
-                }
-            )
-
-        total = len(pdf_urls)
-        self.stdout.write(self.style.SUCCESS(f"Total PDFs to download: {total}"))
-        count = 0
-        for pdf_obj in pdf_urls:
-            urls = pdf_obj.get("urls")
-            save_dir = pdf_obj.get("save_dir")
-            filename = pdf_obj.get("filename")
-            count += 1
-            self.stdout.write(self.style.SUCCESS(f"Downloading PDF {count}/{total}"))
-            for url in urls:
-                item = {
-                    "pdf_url": url,
-                    "save_dir": save_dir,
-                    "filename": filename,
-                    "formatter": f"PDF-DOWNLOADER-{count}/{total}",
-                    "updated_headers": self.updated_headers,
-                }
-                download_pdf(item)
\ No newline at end of file
+        # Only the columns needed, streamed from a server side cursor, so the
+        # large response blobs never leave the database.
+        qs = (
+            Document.objects
+            .filter(source__name__in=self.document_sources, document_urls__isnull=False)
+            .exclude(document_urls=[])
+            .order_by("id")
+        )
+        total = qs.count()
+        rows = qs.values_list("id", "title", "document_urls", "pdf_hashes").iterator(chunk_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Total documents with PDFs: {total}"))
+
+        started = time()
+        done = skipped = files = failed = 0
+        updates = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (doc_id, *_), future in submit_bounded(executor, self.download_document, rows, max_workers * 2):
+                done += 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"[X] Document {doc_id}: {e}"))
+                    result = False
+
+                if result is None:
+                    skipped += 1
+                elif result:
+                    _, hashes, downloaded = result
+                    files += downloaded
+                    failed += len(hashes) - downloaded
+                    updates.append(Document(id=doc_id, pdf_hashes=hashes))
+
+                if len(updates) >= batch_size:
+                    Document.objects.bulk_update(updates, ["pdf_hashes"])
+                    updates = []
+                if done % 25 == 0 or done == total:
+                    elapsed = (time() - started) or 1e-9
+                    self.stdout.write(self.style.SUCCESS(
+                        f"[{done}/{total}] {skipped} already verified, {files} files fetched, "
+                        f"{failed} failed, {done / elapsed:.1f} docs/s, {files / elapsed:.1f} files/s"
+                    ))
+
+        Document.objects.bulk_update(updates, ["pdf_hashes"])
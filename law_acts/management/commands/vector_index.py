@@ -0,0 +1,101 @@
+from statistics import quantiles
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from law_acts.models import TextChunk
+from law_acts.vector_search import create_index, drop_index, search_chunks
+
+
+class Command(BaseCommand):
+    help = "Creates/drops ANN indexes on text_chunks.vector_embedding and benchmarks recall and latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--create', type=str, choices=['hnsw', 'ivfflat'], default=None,
+            help='Build an index of this type (CREATE INDEX CONCURRENTLY).',
+        )
+        parser.add_argument(
+            '--drop', type=str, choices=['hnsw', 'ivfflat'], default=None,
+            help='Drop the index of this type.',
+        )
+        parser.add_argument('--m', type=int, default=16, help='hnsw: max connections per layer.')
+        parser.add_argument('--ef_construction', type=int, default=64, help='hnsw: candidate list size while building.')
+        parser.add_argument('--lists', type=int, default=100, help='ivfflat: number of inverted lists, ~rows/1000 up to 1M rows.')
+        parser.add_argument(
+            '--maintenance_work_mem', type=str, default=None,
+            help="maintenance_work_mem for the build, e.g. '2GB', hnsw builds are much faster when the graph fits.",
+        )
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help='Report recall@k against exact search and p50/p99 latency.',
+        )
+        parser.add_argument('--queries', type=int, default=100, help='Sampled query vectors for --benchmark.')
+        parser.add_argument('--k', type=int, default=10, help='Top-k for --benchmark.')
+        parser.add_argument(
+            '--ef_search', type=int, nargs='*', default=[40],
+            help='hnsw.ef_search values to benchmark.',
+        )
+        parser.add_argument(
+            '--probes', type=int, nargs='*', default=[],
+            help='ivfflat.probes values to benchmark.',
+        )
+
+    def handle(self, *args, **options):
+        if options['drop']:
+            drop_index(options['drop'])
+            self.stdout.write(self.style.SUCCESS(f"Dropped {options['drop']} index"))
+
+        if options['create']:
+            started = perf_counter()
+            sql = create_index(
+                options['create'],
+                m=options['m'],
+                ef_construction=options['ef_construction'],
+                lists=options['lists'],
+                maintenance_work_mem=options['maintenance_work_mem'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"{sql} [{perf_counter() - started:.1f}s]"))
+
+        if options['benchmark']:
+            self.benchmark(options['queries'], options['k'], options['ef_search'], options['probes'])
+
+    def benchmark(self, query_count, k, ef_search_values, probes_values):
+        vectors = list(
+            TextChunk.objects
+            .filter(vector_embedding__isnull=False)
+            .order_by('?')
+            .values_list('vector_embedding', flat=True)[:query_count]
+        )
+        if not vectors:
+            self.stdout.write(self.style.ERROR("No embedded chunks to benchmark with."))
+            return
+
+        exact = []
+        exact_latencies = []
+        for vector in vectors:
+            started = perf_counter()
+            exact.append({chunk_id for chunk_id, _ in search_chunks(vector, k, exact=True)})
+            exact_latencies.append(perf_counter() - started)
+        self.report("exact", 1.0, exact_latencies)
+
+        runs = [("hnsw.ef_search", value, {"ef_search": value}) for value in ef_search_values]
+        runs += [("ivfflat.probes", value, {"probes": value}) for value in probes_values]
+        for name, value, params in runs:
+            hits = 0
+            latencies = []
+            for vector, truth in zip(vectors, exact):
+                started = perf_counter()
+                found = search_chunks(vector, k, **params)
+                latencies.append(perf_counter() - started)
+                hits += len(truth & {chunk_id for chunk_id, _ in found})
+            recall = hits / max(sum(len(truth) for truth in exact), 1)
+            self.report(f"{name}={value}", recall, latencies)
+
+    def report(self, label, recall, latencies):
+        if len(latencies) > 1:
+            cuts = quantiles(latencies, n=100, method='inclusive')
+            p50, p99 = cuts[49], cuts[98]
+        else:
+            p50 = p99 = latencies[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"[{label}] recall: {recall:.3f}, p50: {p50 * 1000:.1f}ms, p99: {p99 * 1000:.1f}ms"
+        ))
@@ -0,0 +1,110 @@
+import os
+import socket
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from time import sleep, time
+from django import db
+from django.core.management.base import BaseCommand
+from law_acts import jobs
+from law_acts.choices import JobStatus
+from nyaya_ai.utils import get_traceback
+
+
+class Command(BaseCommand):
+    help = "Runs queued crawl / ingest jobs, any number of workers can share one database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kinds', nargs='*', choices=sorted(jobs.HANDLERS),
+            help='Only run these job kinds, all by default.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Jobs run at once by this worker.',
+        )
+        parser.add_argument(
+            '--lease_seconds', type=int, default=300,
+            help='Lease taken on a job, renewed while it runs. A worker that dies loses its jobs after this long.',
+        )
+        parser.add_argument(
+            '--poll_seconds', type=float, default=5,
+            help='Wait between polls when the queue is empty.',
+        )
+        parser.add_argument(
+            '--exit_when_empty', action='store_true',
+            help='Stop once no job is runnable and none is running, instead of polling forever.',
+        )
+
+    def handle(self, *args, **options):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = options['concurrency']
+        lease = timedelta(seconds=options['lease_seconds'])
+        poll_seconds = options['poll_seconds']
+        kinds = options.get('kinds')
+
+        self.running = {} # future -> job
+        self.running_lock = Lock()
+        stopped = Event()
+        heartbeat = Thread(target=self.heartbeat, args=(lease, stopped), daemon=True)
+        heartbeat.start()
+
+        started = time()
+        counts = {"done": 0, "retried": 0, "dead": 0}
+        self.stdout.write(self.style.SUCCESS(f"[{self.worker}] Waiting for jobs..."))
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                while True:
+                    free = concurrency - len(self.running)
+                    claimed = jobs.claim(self.worker, free, lease, kinds) if free else []
+                    with self.running_lock:
+                        for job in claimed:
+                            self.running[executor.submit(jobs.run, job)] = job
+
+                    if not self.running:
+                        if options['exit_when_empty']:
+                            break
+                        sleep(poll_seconds)
+                        continue
+
+                    finished, _ = wait(list(self.running), timeout=poll_seconds, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        with self.running_lock:
+                            job = self.running.pop(future)
+                        try:
+                            follow_ups = future.result()
+                        except Exception as e:
+                            status = jobs.fail(job, get_traceback(e))
+                            counts["dead" if status == JobStatus.DEAD else "retried"] += 1
+                            self.stdout.write(self.style.ERROR(
+                                f"[X] Job {job.id} ({job.kind}) attempt {job.attempts}/{job.max_attempts}: {e}"
+                            ))
+                            continue
+
+                        jobs.complete(job, follow_ups)
+                        counts["done"] += 1
+
+                    elapsed = (time() - started) or 1e-9
+                    self.stdout.write(self.style.SUCCESS(
+                        f"[{self.worker}] done: {counts['done']}, retried: {counts['retried']}, "
+                        f"dead: {counts['dead']}, running: {len(self.running)}, {counts['done'] / elapsed:.2f} jobs/s"
+                    ))
+        finally:
+            stopped.set()
+            heartbeat.join()
+
+    def heartbeat(self, lease, stopped):
+        """Renew the lease of running jobs well before it runs out."""
+        try:
+            while not stopped.wait(lease.total_seconds() / 3):
+                with self.running_lock:
+                    job_ids = [job.id for job in self.running.values()]
+                if not job_ids:
+                    continue
+                try:
+                    jobs.heartbeat(self.worker, job_ids, lease)
+                except Exception as e:
+                    # Keep beating, the next renewal may still land before the lease runs out.
+                    self.stdout.write(self.style.ERROR(f"[X] Heartbeat failed: {e}"))
+        finally:
+            db.connection.close()
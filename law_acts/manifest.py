@@ -0,0 +1,80 @@
+import json
+import os
+
+
+def iter_pdf_files(path, exclude=()):
+    """
+    Walk `path` with scandir, yielding (file_path, stat) for PDFs as they are
+    found. Directories in `exclude` are not entered.
+    """
+    if os.path.isfile(path):
+        yield path, os.stat(path)
+        return
+
+    exclude = {os.path.realpath(directory) for directory in exclude}
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.realpath(entry.path) not in exclude:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(".pdf") and entry.is_file():
+                        yield entry.path, entry.stat()
+        except (PermissionError, FileNotFoundError):
+            continue
+
+
+class IngestManifest:
+    """
+    On-disk record of ingested files as JSON lines of
+    {"path", "size", "mtime", "sha256"}, the last line for a path wins.
+    Files whose size and mtime match their entry are skipped without
+    touching the database.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        self.lines = 0
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partial last line from an interrupted run
+                        continue
+                    self.entries[entry["path"]] = entry
+                    self.lines += 1
+
+        directory = os.path.dirname(manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(manifest_path, "a")
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def is_unchanged(self, path, stat):
+        entry = self.entries.get(path)
+        return bool(entry) and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def record(self, path, size, mtime, sha256):
+        entry = {"path": path, "size": size, "mtime": mtime, "sha256": sha256}
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self.lines += 1
+
+    def close(self):
+        self._file.close()
+        # Rewrite the file without superseded lines once it has grown stale.
+        if self.lines > 2 * len(self.entries):
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.manifest_path)
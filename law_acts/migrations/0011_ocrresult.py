@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0010_remove_textchunk_embedding_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('image_hash', models.CharField(max_length=64, unique=True)),
+                ('ocr_text', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'db_table': 'ocr_results',
+            },
+        ),
+    ]
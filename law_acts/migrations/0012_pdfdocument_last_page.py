@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0011_ocrresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='last_page',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0012_pdfdocument_last_page'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textchunk',
+            name='text_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0013_textchunk_text_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indiankanoon',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='indiankanoon',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:40
+
+import law_acts.fields
+from django.db import migrations, models
+
+
+COMPRESSED_COLUMNS = [
+    ('documents', 'doc_content'),
+    ('documents', 'response'),
+    ('indian_kanoon', 'content'),
+    ('pdf_pages', 'ocr_text'),
+    ('pdf_pages', 'raw_text'),
+    ('text_chunks', 'chunk_text'),
+]
+
+
+def to_bytea_sql(table, column):
+    # convert_to keeps the text as plain UTF-8 bytes (a ::bytea cast would
+    # interpret backslashes), CompressedTextField reads those as-is until
+    # `compress_text --rewrite` compresses them. Compressed values are zstd
+    # frames, so TOAST should store them without compressing again.
+    return (
+        f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE bytea USING convert_to("{column}", \'UTF8\'); '
+        f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET STORAGE EXTERNAL;'
+    )
+
+
+def to_text_sql(table, column):
+    # Only reversible until rows have been compressed.
+    return (
+        f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET STORAGE EXTENDED; '
+        f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE text USING convert_from("{column}", \'UTF8\');'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0014_indiankanoon_claims'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dict_id', models.BigIntegerField(unique=True)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'compression_dictionaries',
+            },
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=to_bytea_sql(table, column),
+                    reverse_sql=to_text_sql(table, column),
+                )
+                for table, column in COMPRESSED_COLUMNS
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='document',
+                    name='doc_content',
+                    field=law_acts.fields.CompressedTextField(blank=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='document',
+                    name='response',
+                    field=law_acts.fields.CompressedTextField(blank=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='indiankanoon',
+                    name='content',
+                    field=law_acts.fields.CompressedTextField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name='pdfpage',
+                    name='ocr_text',
+                    field=law_acts.fields.CompressedTextField(blank=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='pdfpage',
+                    name='raw_text',
+                    field=law_acts.fields.CompressedTextField(blank=True, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='textchunk',
+                    name='chunk_text',
+                    field=law_acts.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0017_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indiankanoon',
+            name='has_next',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='indiankanoon',
+            name='result_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
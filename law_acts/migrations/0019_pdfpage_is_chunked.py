@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('law_acts', '0018_indiankanoon_result_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfpage',
+            name='is_chunked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 from pgvector.django import VectorField
+from law_acts.choices import JobStatus
+from law_acts.fields import CompressedTextField
 
 
 class BaseModel(models.Model):
@@ -49,11 +51,12 @@ class Document(BaseModel):
     doc_id = models.CharField(blank=True, max_length=100, null=True, unique=True)
     document_urls = models.JSONField(blank=True, default=list, null=True)
     metadata = models.JSONField(blank=True, default=dict, null=True)
-    response = models.TextField(blank=True, null=True)
+    response = CompressedTextField(blank=True, null=True)
     is_url_external = models.BooleanField(default=False)
     saved_metadata = models.JSONField(blank=True, default=dict, null=True)
-    doc_content = models.TextField(blank=True, null=True)
+    doc_content = CompressedTextField(blank=True, null=True)
     content_type = models.CharField(blank=True, max_length=50, null=True)
+    pdf_hashes = models.JSONField(blank=True, default=list) # SHA-256 of the downloaded document_urls, see nyaya_ai.blob_store
 
     class Meta:
         verbose_name = "Document"
@@ -67,6 +70,7 @@ class Act(BaseModel):
     pdf_urls = models.JSONField(default=list)
     is_pdf_fetched = models.BooleanField(default=False)
     pdf_fetched_at = models.DateTimeField(blank=True, null=True)
+    pdf_hashes = models.JSONField(blank=True, default=list) # SHA-256 of the downloaded pdf_urls, see nyaya_ai.blob_store
 
     class Meta:
         verbose_name = "Act"
@@ -78,10 +82,14 @@ class IndianKanoon(BaseModel):
     title = models.CharField(max_length=255, blank=True, null=True)
     url = models.URLField(unique=True)
     date = models.DateField(null=True)
-    content = models.TextField(null=True)
+    content = CompressedTextField(null=True)
     is_page_url = models.BooleanField(default=False)
     is_fetched = models.BooleanField(default=False)
     fetched_at = models.IntegerField(null=True)
+    claimed_by = models.CharField(max_length=255, blank=True, null=True) # Worker currently fetching the row
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    result_count = models.IntegerField(blank=True, null=True) # Search pages: total hits, lets a re-run rebuild its page tasks
+    has_next = models.BooleanField(blank=True, null=True)
 
     class Meta:
         verbose_name = "IndianKanoon"
@@ -97,7 +105,9 @@ class PDFDocument(BaseModel):
     """Represents a PDF file saved in the system."""
     file_path = models.CharField(max_length=1024, unique=True)
     original_filename = models.CharField(max_length=512)
+    sha256 = models.CharField(max_length=64, unique=True, blank=True, null=True) # Copies of one PDF are ingested once
     total_pages = models.IntegerField(default=0)
+    last_page = models.IntegerField(default=0) # Last page committed, ingestion resumes after it
     is_processed = models.BooleanField(default=False)
     processing_error = models.TextField(blank=True, null=True)
     
@@ -109,8 +119,9 @@ class PDFPage(BaseModel):
     """Extracted text per page from a PDF."""
     pdf = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='pages')
     page_number = models.IntegerField()
-    raw_text = models.TextField(blank=True, null=True)
-    ocr_text = models.TextField(blank=True, null=True) # Text from images via OCR
+    raw_text = CompressedTextField(blank=True, null=True)
+    ocr_text = CompressedTextField(blank=True, null=True) # Text from images via OCR
+    is_chunked = models.BooleanField(default=False) # Set by chunk_pages, also for pages with no text to chunk
     
     class Meta:
         db_table = "pdf_pages"
@@ -131,9 +142,56 @@ class PDFImage(BaseModel):
 class TextChunk(BaseModel):
     """Chunked text for RAG."""
     pdf_page = models.ForeignKey(PDFPage, on_delete=models.CASCADE, related_name='chunks')
-    chunk_text = models.TextField()
+    chunk_text = CompressedTextField()
+    text_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True) # sha256 of chunk_text
     vector_embedding = VectorField(dimensions=384, null=True)
     chunk_index = models.IntegerField()
     
     class Meta:
         db_table = "text_chunks"
+
+
+class OCRResult(BaseModel):
+    """OCR output of an embedded image, keyed by the sha256 of its bytes."""
+    image_hash = models.CharField(max_length=64, unique=True)
+    ocr_text = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = "ocr_results"
+
+
+class CompressionDictionary(BaseModel):
+    """zstd dictionary trained on the corpus, used by CompressedTextField."""
+    dict_id = models.BigIntegerField(unique=True)
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "compression_dictionaries"
+
+
+class Job(BaseModel):
+    """A unit of crawl / ingest work leased by `manage.py worker` processes, see law_acts.jobs."""
+    kind = models.CharField(max_length=100, db_index=True)
+    payload = models.JSONField(default=dict)
+    key = models.CharField(max_length=512, blank=True, null=True) # Deduplicates active jobs
+    status = models.CharField(choices=JobStatus.choices, default=JobStatus.PENDING, max_length=20)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    leased_by = models.CharField(max_length=255, blank=True, null=True)
+    leased_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        db_table = "jobs"
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="jobs_status_run_after_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status__in=[JobStatus.PENDING, JobStatus.RUNNING]),
+                name="jobs_active_key_unique",
+            ),
+        ]
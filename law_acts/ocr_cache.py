@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from law_acts.models import OCRResult
+
+
+def image_hash(image_bytes):
+    return sha256(image_bytes).hexdigest()
+
+
+class OCRCache:
+    """
+    Two tier cache of OCR output keyed by image hash:
+    - an in-process LRU (`max_size` entries, 0 disables it)
+    - the `ocr_results` table, shared by every worker and every run
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = Lock()
+
+    def _remember(self, key, text):
+        if not self.max_size:
+            return
+
+        with self._lock:
+            self._lru[key] = text
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def lookup(self, keys):
+        """
+        Returns ({hash: text} for the cached keys, hit/miss counts).
+        Keys missing from memory are looked up in one query.
+        """
+        found = {}
+        counts = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                    counts["memory_hits"] += 1
+
+        pending = [key for key in keys if key not in found]
+        if pending:
+            rows = OCRResult.objects.filter(image_hash__in=pending).values_list("image_hash", "ocr_text")
+            for key, text in rows:
+                found[key] = text
+                counts["db_hits"] += 1
+                self._remember(key, text)
+
+        counts["misses"] = len(keys) - len(found)
+        return found, counts
+
+    def store(self, results):
+        """Save freshly OCR'd {hash: text} to both tiers."""
+        if not results:
+            return
+
+        OCRResult.objects.bulk_create(
+            [OCRResult(image_hash=key, ocr_text=text) for key, text in results.items()],
+            ignore_conflicts=True,
+        )
+        for key, text in results.items():
+            self._remember(key, text)
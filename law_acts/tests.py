@@ -1,3 +1,199 @@
-from django.test import TestCase
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from statistics import mean
+from tempfile import TemporaryDirectory
+from threading import Event, Lock, Thread
+from time import sleep
+from unittest.mock import patch
+from django.test import SimpleTestCase, override_settings
+from nyaya_ai import rate_limiter
+from nyaya_ai.http_client import HttpClient
+from nyaya_ai.rate_limiter import HostLimiter
+from nyaya_ai.utils import download_pdf, pdf_save_path, split_into_chunks
 
-# Create your tests here.
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Answers 429 whenever more than `capacity` requests are in flight."""
+    capacity = 3
+    in_flight = 0
+    counts = {200: 0, 429: 0}
+    lock = Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            status = 429 if cls.in_flight > cls.capacity else 200
+            cls.counts[status] += 1
+        sleep(0.02)
+        with cls.lock:
+            cls.in_flight -= 1
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class HostLimiterTests(SimpleTestCase):
+    def setUp(self):
+        ThrottlingHandler.counts = {200: 0, 429: 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host = f"127.0.0.1:{self.server.server_port}"
+        self.url = f"http://{host}/"
+        # High rate ceiling so only the concurrency limit is exercised.
+        self.limiter = HostLimiter(16, max_rate=1000)
+        patcher = patch.dict(rate_limiter._limiters, {host: self.limiter})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrency_converges_to_server_capacity(self):
+        client = HttpClient(max_per_host=16)
+        samples = []
+        stopped = Event()
+
+        def sample():
+            while not stopped.wait(0.01):
+                samples.append(int(self.limiter.concurrency))
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: client.get(self.url).status_code, range(200)))
+            sampler = Thread(target=sample)
+            sampler.start()
+            list(executor.map(lambda _: client.get(self.url).status_code, range(400)))
+            stopped.set()
+            sampler.join()
+
+        capacity = ThrottlingHandler.capacity
+        # Every 429 the server sent went through the limiter, retries included.
+        self.assertEqual(self.limiter.throttled, ThrottlingHandler.counts[429])
+        # After warm up the AIMD sawtooth oscillates around the server's
+        # capacity, overshooting by at most a slot or two before backing off.
+        self.assertLessEqual(max(samples), capacity + 2)
+        self.assertAlmostEqual(mean(samples), capacity, delta=1)
+        self.assertLess(ThrottlingHandler.counts[429] / sum(ThrottlingHandler.counts.values()), 0.1)
+
+    def test_recovers_from_lasting_latency_rise(self):
+        now = [0.0]
+
+        def run(requests, latency):
+            done = 0
+            while done < requests:
+                slots = int(self.limiter.concurrency)
+                now[0] += max(latency, (slots + 0.5) / self.limiter.rate)
+                for _ in range(slots):
+                    self.limiter.acquire()
+                for _ in range(slots):
+                    self.limiter.release(200, latency, "GET /doc/#")
+                done += slots
+
+        with patch.object(rate_limiter, "monotonic", lambda: now[0]):
+            self.limiter.last_refill = now[0]
+            run(300, 0.1)
+            run(400, 0.25)
+            run(2000, 0.25)
+        # A host that stays slower becomes the new baseline, it is not cut forever.
+        self.assertEqual(int(self.limiter.concurrency), self.limiter.max_concurrency)
+
+
+class PDFHandler(BaseHTTPRequestHandler):
+    """Serves one file with an ETag, answering conditional and If-Range requests."""
+    body = b"%PDF-1.4 " + bytes(range(256)) * 8
+    etag = '"v1"'
+    statuses = []
+
+    def do_GET(self):
+        cls = type(self)
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if self.headers.get("If-None-Match") == cls.etag:
+            self.reply(304)
+        elif match and self.headers.get("If-Range") == cls.etag:
+            offset = int(match.group(1))
+            if offset >= len(cls.body):
+                self.reply(416)
+            else:
+                self.reply(206, cls.body[offset:], {"Content-Range": f"bytes {offset}-{len(cls.body) - 1}/{len(cls.body)}"})
+        else:
+            self.reply(200, cls.body)
+
+    def reply(self, status, body=b"", headers=None):
+        type(self).statuses.append(status)
+        self.send_response(status)
+        self.send_header("ETag", type(self).etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadPDFTests(SimpleTestCase):
+    def setUp(self):
+        PDFHandler.statuses = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PDFHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(BLOB_DIR=os.path.join(tmp.name, "blobs"))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.item = {
+            "pdf_url": f"http://127.0.0.1:{self.server.server_port}/act.pdf",
+            "save_dir": os.path.join(tmp.name, "pdfs"),
+            "filename": "act",
+            "client": HttpClient(),
+        }
+        self.save_path = pdf_save_path(self.item["save_dir"], "act")
+        self.part_path = f"{self.save_path}.part"
+
+    def write_part(self, data):
+        os.makedirs(self.item["save_dir"], exist_ok=True)
+        with open(self.part_path, "wb") as f:
+            f.write(data)
+        with open(f"{self.part_path}.json", "w") as f:
+            json.dump({"etag": PDFHandler.etag, "last_modified": None}, f)
+
+    def assertDownloaded(self, path):
+        self.assertEqual(path, self.save_path)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), PDFHandler.body)
+        self.assertFalse(os.path.exists(self.part_path))
+
+    def test_unchanged_file_is_revalidated(self):
+        self.assertDownloaded(download_pdf(self.item))
+        self.assertDownloaded(download_pdf(self.item))
+        self.assertEqual(PDFHandler.statuses, [200, 304])
+
+    def test_interrupted_download_is_resumed(self):
+        self.write_part(PDFHandler.body[:1000])
+        self.assertDownloaded(download_pdf(self.item))
+        self.assertEqual(PDFHandler.statuses, [206])
+
+    def test_part_past_the_end_is_restarted(self):
+        self.write_part(PDFHandler.body + b"stale")
+        self.assertDownloaded(download_pdf(self.item))
+        self.assertEqual(PDFHandler.statuses, [416, 200])
+
+
+class SplitIntoChunksTests(SimpleTestCase):
+    def test_windows_overlap_on_whole_words(self):
+        words = [f"word{i}" for i in range(400)]
+        chunks = split_into_chunks(" ".join(words), chunk_size=100, overlap=30)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertTrue(set(chunk.split()) <= set(words))
+            # Each window repeats the tail of the previous one.
+            self.assertIn(chunk.split()[0], previous.split())
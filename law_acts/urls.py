@@ -0,0 +1,6 @@
+from django.urls import path
+from law_acts import views
+
+urlpatterns = [
+    path('search/', views.search, name='search'),
+]
@@ -0,0 +1,60 @@
+from django.db import connection, transaction
+from pgvector.django import CosineDistance
+from law_acts.models import TextChunk
+
+INDEX_NAMES = {
+    "hnsw": "text_chunks_vector_hnsw_idx",
+    "ivfflat": "text_chunks_vector_ivfflat_idx",
+}
+
+
+def create_index(method, m=16, ef_construction=64, lists=100, maintenance_work_mem=None):
+    """
+    Build an ANN index on text_chunks.vector_embedding (cosine distance)
+    without blocking writes. Returns the SQL that was run.
+    """
+    if method == "hnsw":
+        params = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == "ivfflat":
+        params = f"lists = {int(lists)}"
+    else:
+        raise ValueError(f"Unknown index method {method}")
+
+    sql = (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAMES[method]} "
+        f"ON {TextChunk._meta.db_table} USING {method} (vector_embedding vector_cosine_ops) "
+        f"WITH ({params})"
+    )
+    with connection.cursor() as cursor:
+        if maintenance_work_mem:
+            cursor.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+        cursor.execute(sql)
+    return sql
+
+
+def drop_index(method):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAMES[method]}")
+
+
+def search_chunks(vector, k=10, ef_search=None, probes=None, exact=False):
+    """
+    Top-k chunks by cosine distance, returned as [(chunk_id, distance)].
+    `ef_search` (hnsw) and `probes` (ivfflat) only apply to this query,
+    `exact` disables index scans to get the true nearest neighbours.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if ef_search:
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+        if probes:
+            cursor.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+        if exact:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+
+        return list(
+            TextChunk.objects
+            .filter(vector_embedding__isnull=False)
+            .annotate(distance=CosineDistance('vector_embedding', vector))
+            .order_by('distance')
+            .values_list('id', 'distance')[:k]
+        )
@@ -1,3 +1,90 @@
-from django.shortcuts import render
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from law_acts.embeddings import embed_texts
+from law_acts.models import TextChunk
+from law_acts.vector_search import search_chunks
 
-# Create your views here.
+MAX_PAGE_SIZE = 50
+MAX_RESULTS = 500
+HNSW_EF_SEARCH = 40 # pgvector's default hnsw.ef_search
+
+# Model inference runs on its own small pool, so slow encodes never block the
+# event loop or starve the thread that sync_to_async uses for the ORM.
+inference_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embed")
+
+
+def get_int(request, name, default, low, high):
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(value, high))
+
+
+@require_GET
+async def search(request):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"error": "q is required"}, status=400)
+
+    page = get_int(request, "page", 1, 1, MAX_RESULTS)
+    page_size = get_int(request, "page_size", 10, 1, MAX_PAGE_SIZE)
+    offset = (page - 1) * page_size
+    if offset >= MAX_RESULTS:
+        return JsonResponse({"error": f"only the top {MAX_RESULTS} results can be paged"}, status=400)
+    k = min(offset + page_size, MAX_RESULTS)
+    # An hnsw scan returns at most ef_search rows (40 by default), deeper
+    # pages need a candidate list at least as long as k.
+    ef_search = max(get_int(request, "ef_search", 0, 0, 1000) or HNSW_EF_SEARCH, k)
+    probes = get_int(request, "probes", 0, 0, 1000) or None
+
+    loop = asyncio.get_running_loop()
+    vectors = await loop.run_in_executor(inference_pool, embed_texts, [query])
+    # The ANN query only returns ids, rows are loaded for the requested page.
+    hits = await sync_to_async(search_chunks)(
+        vectors[0], k=k, ef_search=ef_search, probes=probes,
+    )
+    hits = hits[offset:offset + page_size]
+
+    # One query joins chunk -> page -> document for every hit.
+    chunks = {
+        chunk.id: chunk
+        async for chunk in TextChunk.objects
+        .filter(id__in=[chunk_id for chunk_id, _ in hits])
+        .select_related("pdf_page__pdf")
+        .only(
+            "id", "chunk_text", "chunk_index",
+            "pdf_page__id", "pdf_page__page_number",
+            "pdf_page__pdf__id", "pdf_page__pdf__file_path", "pdf_page__pdf__original_filename",
+        )
+    }
+
+    results = []
+    for chunk_id, distance in hits:
+        chunk = chunks.get(chunk_id)
+        if not chunk:
+            continue
+        pdf = chunk.pdf_page.pdf
+        results.append({
+            "chunk_id": chunk.id,
+            "score": 1 - distance,
+            "text": chunk.chunk_text,
+            "chunk_index": chunk.chunk_index,
+            "citation": {
+                "pdf_id": pdf.id,
+                "filename": pdf.original_filename,
+                "file_path": pdf.file_path,
+                "page_number": chunk.pdf_page.page_number,
+            },
+        })
+
+    return JsonResponse({
+        "query": query,
+        "page": page,
+        "page_size": page_size,
+        "has_next": len(hits) == page_size and offset + page_size < MAX_RESULTS,
+        "results": results,
+    })
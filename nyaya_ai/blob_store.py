@@ -0,0 +1,41 @@
+import os
+import shutil
+from django.conf import settings
+
+
+def blob_path(sha256):
+    return os.path.join(settings.BLOB_DIR, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+
+def store_blob(path, sha256):
+    """
+    Make `path` share storage with the blob for its content, creating the
+    blob from it if the content is new. Per-source paths become hardlinks of
+    one blob, so a PDF published on several portals is kept once on disk.
+    """
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        if os.path.samefile(path, target):
+            return target
+        tmp = f"{path}.link"
+        if os.path.lexists(tmp):
+            # Left behind by an interrupted run.
+            os.remove(tmp)
+        try:
+            os.link(target, tmp)
+        except OSError:
+            # Store on another filesystem, keep the copy.
+            return target
+        os.replace(tmp, path)
+        return target
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileExistsError:
+        # Another worker stored the same content first.
+        return store_blob(path, sha256)
+    except OSError:
+        shutil.copyfile(path, f"{target}.tmp")
+        os.replace(f"{target}.tmp", target)
+    return target
@@ -0,0 +1,128 @@
+import json
+import os
+from hashlib import sha256
+from threading import Lock
+from time import time
+from requests import HTTPError
+
+
+class CachedResponse:
+    """The parts of requests.Response the scrapers use, served from disk."""
+
+    def __init__(self, url, status_code, content, headers, encoding):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(f"{self.status_code} for url: {self.url}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class HttpCache:
+    """
+    On-disk cache of GET responses. Entries younger than `ttl` seconds are
+    served without a request, older ones are revalidated with
+    If-None-Match / If-Modified-Since and served from disk on a 304.
+    """
+
+    def __init__(self, cache_dir, ttl=3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_saved": 0}
+        self._lock = Lock()
+
+    def _paths(self, url):
+        key = sha256(url.encode()).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.json", f"{base}.body"
+
+    def _count(self, stat, size=0):
+        with self._lock:
+            self.stats[stat] += 1
+            self.stats["bytes_saved"] += size
+
+    def _load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _store(self, url, meta, body=None):
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        if body is not None:
+            with open(f"{body_path}.tmp", "wb") as f:
+                f.write(body)
+            os.replace(f"{body_path}.tmp", body_path)
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    def get(self, url, fetch, ttl=None):
+        """
+        Return a cached or fresh response for `url`. `fetch(headers)` performs
+        the actual GET with the extra conditional headers.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        meta, body = self._load(url)
+        if meta and time() - meta["stored_at"] < ttl:
+            self._count("hits", len(body))
+            return self._response(url, meta, body)
+
+        conditional = {}
+        if meta and meta.get("etag"):
+            conditional["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            conditional["If-Modified-Since"] = meta["last_modified"]
+
+        response = fetch(conditional)
+        if response.status_code == 304 and meta:
+            meta["stored_at"] = time()
+            self._store(url, meta)
+            self._count("revalidated", len(body))
+            return self._response(url, meta, body)
+
+        self._count("misses")
+        if response.status_code == 200:
+            self._store(url, {
+                "stored_at": time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "encoding": response.encoding or response.apparent_encoding,
+                "headers": dict(response.headers),
+            }, response.content)
+        return response
+
+    def _response(self, url, meta, body):
+        return CachedResponse(url, 200, body, meta.get("headers", {}), meta.get("encoding"))
+
+    def report(self):
+        total = self.stats["hits"] + self.stats["revalidated"] + self.stats["misses"]
+        served = self.stats["hits"] + self.stats["revalidated"]
+        rate = (served / total * 100) if total else 0
+        return (
+            f"hits: {self.stats['hits']}, revalidated (304): {self.stats['revalidated']}, "
+            f"misses: {self.stats['misses']}, hit rate: {rate:.1f}%, "
+            f"bytes saved: {self.stats['bytes_saved'] / 1e6:.2f}MB"
+        )
@@ -0,0 +1,151 @@
+from threading import Lock
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from nyaya_ai.rate_limiter import THROTTLE_STATUSES, host_limiter, request_class
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Pragma": "no-cache",
+}
+DEFAULT_TIMEOUT = (10, 60) # (connect, read) seconds
+POOL_SIZE = 64
+# Connection errors only. Throttled / 5xx responses are retried in
+# HttpClient.request, so every attempt passes through the host limiter.
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(),
+    allowed_methods=("GET", "HEAD"),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+STATUS_RETRIES = 3
+RETRY_METHODS = ("GET", "HEAD")
+BACKOFF_SECONDS = 0.5
+MAX_RETRY_AFTER = 120
+
+_session = None
+_session_lock = Lock()
+
+
+def retry_after(response):
+    """Seconds the server asked us to wait, None if it didn't say."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def shared_session():
+    """One keep-alive connection pool per process, shared by every command."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+
+class HttpClient:
+    """
+    Thin wrapper over the shared session with its own header set, so
+    commands no longer mutate a module level dict to set their Referer.
+    Requests to one host share an adaptive limiter across every client in
+    the process, which backs off on 429/5xx and rising latency and never
+    exceeds `max_per_host` in flight. With an HttpCache, plain (non
+    streamed) GETs go through it.
+    """
+
+    def __init__(self, headers=None, max_per_host=16, timeout=DEFAULT_TIMEOUT, cache=None):
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.cache = cache
+
+    def limiter(self, url):
+        return host_limiter(urlsplit(url).netloc, self.max_per_host)
+
+    def request(self, method, url, headers=None, **kwargs):
+        """
+        Send a request, retrying 429/5xx with exponential backoff or the
+        server's Retry-After. Each attempt takes its own limiter slot, so
+        the limiter sees every throttled response.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        headers = {**self.headers, **(headers or {})}
+        for attempt in range(STATUS_RETRIES + 1):
+            response = self.send(method, url, headers, kwargs)
+            if (
+                response.status_code not in THROTTLE_STATUSES
+                or method not in RETRY_METHODS
+                or attempt == STATUS_RETRIES
+            ):
+                return response
+
+            delay = retry_after(response)
+            delay = BACKOFF_SECONDS * 2 ** attempt if delay is None else min(delay, MAX_RETRY_AFTER)
+            response.close()
+            sleep(delay)
+
+    def send(self, method, url, headers, kwargs):
+        limiter = self.limiter(url)
+        kind = request_class(method, url)
+        limiter.acquire()
+        started = monotonic()
+        try:
+            response = shared_session().request(method, url, headers=headers, **kwargs)
+        except Exception:
+            limiter.release(None, monotonic() - started, kind)
+            raise
+
+        latency = monotonic() - started
+        if not kwargs.get("stream"):
+            limiter.release(response.status_code, latency, kind)
+            return response
+
+        # The body of a streamed response is read after we return, keep the
+        # slot until the caller closes it. Latency stays time to headers.
+        close = response.close
+        released = []
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    limiter.release(response.status_code, latency, kind)
+
+        response.close = close_and_release
+        return response
+
+    def get(self, url, **kwargs):
+        if self.cache is None or kwargs.get("stream"):
+            return self.request("GET", url, **kwargs)
+
+        headers = kwargs.pop("headers", None) or {}
+        return self.cache.get(
+            url, lambda conditional: self.request("GET", url, headers={**headers, **conditional}, **kwargs)
+        )
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self.request("HEAD", url, **kwargs)
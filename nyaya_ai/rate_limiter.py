@@ -0,0 +1,141 @@
+import re
+from threading import Condition, Lock
+from time import monotonic
+from urllib.parse import urlsplit
+
+THROTTLE_STATUSES = (429, 500, 502, 503, 504)
+DECREASE_FACTOR = 0.5 # Multiplicative decrease on throttling / errors
+LATENCY_DECREASE_FACTOR = 0.8 # Gentler decrease when latency alone degrades
+LATENCY_FACTOR = 2.0 # Latency this many times the best seen counts as congestion
+LATENCY_ALPHA = 0.2 # Weight of the newest sample in the latency average
+BASELINE_ALPHA = 0.02 # Pace at which the best latency drifts up to a lasting rise
+MAX_RATE = 50.0 # Requests per second a host starts at and never exceeds
+MIN_RATE = 0.2
+RATE_STEP = 0.5 # Additive increase of the rate per successful response
+
+_limiters = {}
+_limiters_lock = Lock()
+
+
+def _ewma(average, sample):
+    return sample if average is None else LATENCY_ALPHA * sample + (1 - LATENCY_ALPHA) * average
+
+
+def request_class(method, url):
+    """Method plus the first path segments with ids masked, requests of one class take similar time."""
+    segments = [re.sub(r"\d+", "#", segment) for segment in urlsplit(url).path.split("/") if segment]
+    return f"{method} /{'/'.join(segments[:3])}"
+
+
+class HostLimiter:
+    """
+    Per-host limit on requests in flight and requests per second, adjusted
+    with additive increase / multiplicative decrease. Successful responses
+    grow concurrency by about one per round trip and the rate by `RATE_STEP`.
+    A 429/5xx, an error or latency rising past `LATENCY_FACTOR` times the
+    recent best for that kind of request cut both, at most once per round
+    trip so one burst of failures counts as a single congestion signal.
+    """
+
+    def __init__(self, max_concurrency, max_rate=MAX_RATE, min_concurrency=1, min_rate=MIN_RATE):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.concurrency = float(max_concurrency)
+        self.rate = float(max_rate)
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.latency = None # Across all requests, for reporting
+        self.latencies = {} # request class -> (average, baseline)
+        self.throttled = 0
+        self.last_decrease = 0.0
+        self.last_refill = monotonic()
+        self._cond = Condition()
+
+    def _refill(self, now):
+        # Burst up to the concurrency limit, so idle time doesn't bank an unbounded burst.
+        self.tokens = min(max(1.0, self.concurrency), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = monotonic()
+                self._refill(now)
+                if self.in_flight < int(self.concurrency) and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                if self.in_flight < int(self.concurrency):
+                    # Only waiting on the bucket, sleep until the next token.
+                    self._cond.wait((1 - self.tokens) / self.rate)
+                else:
+                    self._cond.wait()
+
+    def release(self, status=None, latency=None, kind=None):
+        """
+        Record the outcome of a request, `status` None means it raised.
+        Latency is compared per `kind` of request (see `request_class`), so a
+        host serving both small JSON and large pages isn't judged slow
+        whenever a large page comes back.
+        """
+        with self._cond:
+            # Only a limit that was actually reached has proven it can grow.
+            limited = self.in_flight >= int(self.concurrency)
+            self.in_flight -= 1
+            now = monotonic()
+            congested = status is None or status in THROTTLE_STATUSES
+            slow = False
+            if latency is not None and not congested:
+                self.latency = _ewma(self.latency, latency)
+                average, best = self.latencies.get(kind, (None, None))
+                average = _ewma(average, latency)
+                # The baseline follows a drop at once and a rise slowly, so a
+                # host that got lastingly slower becomes the new normal after
+                # a few dozen responses instead of being cut forever.
+                best = average if best is None or average < best else best + BASELINE_ALPHA * (average - best)
+                self.latencies[kind] = (average, best)
+                slow = average > best * LATENCY_FACTOR
+
+            if congested or slow:
+                if now - self.last_decrease >= (self.latency or 0):
+                    factor = DECREASE_FACTOR if congested else LATENCY_DECREASE_FACTOR
+                    self.concurrency = max(self.min_concurrency, self.concurrency * factor)
+                    self.rate = max(self.min_rate, self.rate * factor)
+                    self.last_decrease = now
+                self.throttled += congested
+            elif limited:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + RATE_STEP)
+            else:
+                self.rate = min(self.max_rate, self.rate + RATE_STEP)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "concurrency": int(self.concurrency),
+                "rate": round(self.rate, 2),
+                "in_flight": self.in_flight,
+                "latency": round(self.latency, 3) if self.latency is not None else None,
+                "throttled": self.throttled,
+            }
+
+
+def host_limiter(host, max_concurrency):
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(max_concurrency)
+        return _limiters[host]
+
+
+def limiter_report():
+    """Current rate and concurrency of every host seen in this process."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return "\n".join(
+        f"{host}: {stats['rate']} req/s, concurrency {stats['concurrency']}, "
+        f"latency {stats['latency']}s, throttled {stats['throttled']}"
+        for host, stats in ((host, limiter.stats()) for host, limiter in limiters.items())
+    )
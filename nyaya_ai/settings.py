@@ -79,4 +79,7 @@ USE_I18N = True
 USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-RESOURCE_DIR = BASE_DIR / 'resources'
\ No newline at end of file
+RESOURCE_DIR = BASE_DIR / 'resources'
+HTTP_CACHE_DIR = RESOURCE_DIR / 'http_cache'
+BLOB_DIR = RESOURCE_DIR / 'blobs' # Content-addressed PDFs, per-source paths are hardlinks into it
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2' # 384-dim, matches TextChunk.vector_embedding
\ No newline at end of file
@@ -1,24 +1,22 @@
 import os
 import re
+import json
 import hashlib
-from requests import get as getReq
 from logging import getLogger
 from indic_transliteration import sanscript
 from indic_transliteration.sanscript import transliterate
 from time import time
+from datetime import datetime
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, as_completed, wait
 from pandas import date_range as get_date_range, to_datetime
+from nyaya_ai.blob_store import store_blob
+from nyaya_ai.http_client import HttpClient
 import traceback
 
 logger = getLogger(__name__)
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-    "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Connection": "keep-alive",
-    "Upgrade-Insecure-Requests": "1",
-    "Pragma": "no-cache",
-}
+http_client = HttpClient()
 
 
 # ------------------------------------------------------------
@@ -68,40 +66,211 @@ def sanitize_and_shorten(name, max_length=120):
     return f"{clean}-{hash_suffix}"
 
 
+def _load_meta(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_meta(path, meta):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _validators(headers):
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+def _record_blob(save_path, meta_path, meta):
+    """Hash the file if the sidecar has no hash yet and link it into the blob store."""
+    if not meta.get("sha256"):
+        meta["sha256"] = file_sha256(save_path)
+        _save_meta(meta_path, meta)
+    store_blob(save_path, meta["sha256"])
+
+
+def pdf_save_path(save_dir, filename, ext="pdf"):
+    return os.path.join(save_dir, f"{sanitize_and_shorten(filename)}.{ext}")
+
+
+def pdf_sha256(save_path):
+    """SHA-256 recorded by `download_pdf` for a mirrored file, None if unknown."""
+    if not save_path:
+        return None
+    return (_load_meta(f"{save_path}.meta.json") or {}).get("sha256")
+
+
+def is_downloaded(save_path, sha256):
+    """True if `save_path` is a complete download whose recorded hash is `sha256`, without touching the network."""
+    meta = _load_meta(f"{save_path}.meta.json")
+    if not sha256 or not meta or meta.get("sha256") != sha256:
+        return False
+    try:
+        return os.path.getsize(save_path) == meta.get("size")
+    except OSError:
+        return False
+
+
 def download_pdf(item: dict):
+    """
+    Mirror `pdf_url` into `save_dir`. The ETag / Last-Modified of every
+    completed download is kept in a `.meta.json` sidecar so later runs only
+    send a conditional GET. Data is written to a `.part` file that is renamed
+    into place once complete, and an interrupted `.part` is resumed with a
+    Range request. The SHA-256 is recorded in the sidecar and the file is
+    linked into the content-addressed blob store.
+    """
     pdf_url = item.get("pdf_url")
     save_dir = item.get("save_dir")
     filename = item.get("filename")
     ext = item.get("ext","pdf")
     formatter = item.get("formatter", "PDF-DOWNLOADER")
-    updated_headers = item.get("updated_headers", headers)
+    client = item.get("client") or http_client
     os.makedirs(save_dir, exist_ok=True)
 
-    filename = f"{sanitize_and_shorten(filename)}.{ext}"
-    save_path = os.path.join(save_dir, filename)
+    save_path = pdf_save_path(save_dir, filename, ext)
+    meta_path = f"{save_path}.meta.json"
+    part_path = f"{save_path}.part"
+    part_meta_path = f"{part_path}.json"
+
+    # Ranges count encoded bytes, ask for the file as is.
+    headers = {"Accept-Encoding": "identity"}
+    meta = _load_meta(meta_path) if os.path.exists(save_path) else None
+    if os.path.exists(save_path) and not (meta and (meta.get("etag") or meta.get("last_modified"))):
+        # Nothing to revalidate against, compare sizes like before.
+        response = client.head(pdf_url)
+        content_length = int(response.headers.get("Content-Length", 0))
+        if response.status_code == 200 and os.path.getsize(save_path) == content_length:
+            meta = meta or {**_validators(response.headers), "size": content_length}
+            _record_blob(save_path, meta_path, meta)
+            print(f"[{formatter}] PDF already exists at {save_path}, size: {content_length}")
+            return save_path
+    elif meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    part_meta = _load_meta(part_meta_path) if offset else None
+    etag = (part_meta or {}).get("etag")
+    # If-Range needs a strong validator, otherwise the part can't be trusted.
+    if_range = etag if etag and not etag.startswith("W/") else (part_meta or {}).get("last_modified")
+    if if_range:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = if_range
+    else:
+        offset = 0
 
-    # Download file
     print(f"[{formatter}] Downloading PDF from {pdf_url} to {save_path}")
-    response = getReq(pdf_url, stream=True, headers=updated_headers, allow_redirects=True)
-    if response.status_code != 200:
-        print(
-            f"[{formatter}] Failed to download PDF from {pdf_url}, status code: {response.status_code}"
-        )
-        return None
+    with client.get(pdf_url, stream=True, headers=headers) as response:
+        if response.status_code == 304:
+            _record_blob(save_path, meta_path, meta)
+            print(f"[{formatter}] PDF unchanged at {save_path}")
+            return save_path
+
+        if response.status_code == 206:
+            mode = "ab"
+            print(f"[{formatter}] Resuming {save_path} from byte {offset}")
+        elif response.status_code == 200:
+            mode, offset = "wb", 0
+            part_meta = _validators(response.headers)
+            _save_meta(part_meta_path, part_meta)
+        elif response.status_code == 416 and offset:
+            # The part no longer fits the file on the server, start over
+            # once this response (and its host slot) is released.
+            os.remove(part_path)
+            mode = None
+        else:
+            print(
+                f"[{formatter}] Failed to download PDF from {pdf_url}, status code: {response.status_code}"
+            )
+            return None
+
+        content_length = response.headers.get("Content-Length")
+        if mode:
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    if chunk:
+                        f.write(chunk)
+
+    if mode is None:
+        return download_pdf(item)
 
-    content_length = int(response.headers.get("Content-Length", 0))
-    if os.path.exists(save_path) and os.path.getsize(save_path) == content_length:
-        print(f"[{formatter}] PDF already exists at {save_path}, size: {content_length}")
-        return save_path
+    size = os.path.getsize(part_path)
+    if content_length is not None and size != offset + int(content_length):
+        # Kept in place, the next run resumes it.
+        print(f"[{formatter}] Incomplete download of {pdf_url}, {size} bytes at {part_path}")
+        return None
 
-    print(f"[{formatter}] Downloading PDF from {pdf_url} to {save_path}, size: {content_length}")
-    with open(save_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+    os.replace(part_path, save_path)
+    _record_blob(save_path, meta_path, {**part_meta, "size": size})
+    os.remove(part_meta_path)
+    print(f"[{formatter}] Downloaded PDF from {pdf_url} to {save_path}, size: {size}")
     return save_path
 
 
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def submit_bounded(executor, fn, tasks, max_in_flight):
+    """
+    Lazily submit fn(*args) for every args tuple in `tasks`, keeping at most
+    `max_in_flight` futures pending so the task source is never drained
+    into memory up front. Yields (args, future) as futures complete.
+    """
+    pending = {}
+    for args in tasks:
+        if len(pending) >= max_in_flight:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+        pending[executor.submit(fn, *args)] = args
+
+    for future in as_completed(pending):
+        yield pending[future], future
+
+
+def run_frontier(executor, tasks, max_in_flight):
+    """
+    Like `submit_bounded`, but every task is a (fn, *args) tuple and fn may
+    return a list of follow-up tasks. Follow-ups are scheduled before new
+    tasks are pulled from `tasks`, newest first, so a subtree is finished
+    before the frontier grows further. Yields (task, future) as futures complete.
+    """
+    tasks = iter(tasks)
+    children = deque()
+    pending = {}
+    while True:
+        while len(pending) < max_in_flight:
+            if children:
+                task = children.pop()
+            else:
+                task = next(tasks, None)
+                if task is None:
+                    break
+            pending[executor.submit(*task)] = task
+
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            task = pending.pop(future)
+            if future.exception() is None and future.result():
+                children.extend(future.result())
+            yield task, future
+
+
 def fetch_time():
     return int(time())
 
@@ -110,6 +279,47 @@ def normalize_text(text:str, rep=""):
     return text.replace(r"\s+", rep).strip()
 
 
+def split_into_chunks(text, chunk_size=1000, overlap=200):
+    """
+    Split text into windows of at most `chunk_size` characters, each
+    overlapping the previous one by about `overlap` characters. Windows are
+    cut on whitespace where possible so words are not split.
+    """
+    text = (text or "").strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            cut = max(text.rfind(" ", start, end), text.rfind("\n", start, end))
+            if cut > start + overlap:
+                end = cut
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        if not text[start - 1].isspace():
+            # Begin the next window after a word boundary, not mid-word.
+            boundary = re.compile(r"\s").search(text, start, end)
+            if boundary:
+                start = boundary.end()
+    return chunks
+
+
+def parse_decision_date(text):
+    """Date from a judgment title like 'A vs B on 12 January, 2005', None if it has none."""
+    match = re.search(r"\bon\s+(\d{1,2})\s+([A-Za-z]+),?\s+(\d{4})\s*$", text or "")
+    if not match:
+        return None
+    try:
+        return datetime.strptime(" ".join(match.groups()), "%d %B %Y").date()
+    except ValueError:
+        return None
+
+
 def generate_dates(start_date="1997-11-05", end_date="today"):
     start_date  = to_datetime(start_date)
     end_date    = to_datetime(end_date)
@@ -7,3 +7,5 @@ python3 manage.py makemigrations --no-input
 python3 manage.py migrate --no-input
 # python3 manage.py load_sources  #  Load News-Sources
 python3 manage.py runserver 0.0.0.0:$PORT
+# Serve the async search API on ASGI instead:
+# uvicorn nyaya_ai.asgi:application --host 0.0.0.0 --port $PORT --workers 4